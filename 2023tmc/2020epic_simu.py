@@ -1,12 +1,21 @@
 # Epidemic and Timer-Based Message Dissemination in VANETs: A Performance Comparison
 # Author: Pietro Spadaccino, Francesca Cuomo, and Andrea Baiocchi
 
+import os
+import sys
+import heapq
 import numpy as np
 import random
 import math
 import matplotlib.pyplot as plt
 import time
-import copy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import neighbor_index
+import event_trace
+import bitset
+import cell_list
+from state_tracker import StateTracker
 
 # Parameters 
 # input
@@ -16,6 +25,14 @@ n = 100
 R = 3
 R_min = 3
 alpha = 0.3
+# 节点每个 slot 移动的最大距离，0 为静态拓扑；大于 0 时每个节点以 [0, SPEED] 内的速度沿随机方向直线移动，在边界反射，
+# 邻居由 cell_list.CellList 增量维护
+SPEED = 0
+
+# 事件记录级别：event_trace.OFF / INFO / DEBUG，记录保存在 tracer 的环形缓冲区中（见 event_trace.py）
+TRACE_LEVEL = event_trace.OFF
+
+tracer = event_trace.Tracer(TRACE_LEVEL)
 
 # 设置随机种子以便结果可复现
 # random.seed(time.time())
@@ -39,13 +56,15 @@ class Node:
     
     # 节点每个时间单位的处理，定义返回值为state，表示节点的状态
     def on_message_receipt(self, msg, slot=0):
-        print(f"Node {self.id} with state {self.state}")
+        if tracer.level:
+            tracer.emit(slot, self.id, event_trace.RECV, msg.id)
         self.T_max = slot
         if self.state == 'R':
             pass
         elif self.state == 'S':
             self.rcv_messages = [msg]
-            self.timer = slot + max(self.T_min, self.T_max * np.ceil(1 - simu.distance[msg.id][self.id] / R))
+            self.timer = slot + max(self.T_min, self.T_max * np.ceil(1 - simu.nbr_index.distance(msg.id, self.id) / R))
+            heapq.heappush(simu.timers, (self.timer, self.id))
             self.state = 'I'
         elif self.state == 'I':
             self.rcv_messages.append(msg)
@@ -53,19 +72,16 @@ class Node:
         self.rev_slot = slot
 
     def evaluate_positions(self):
-        not_reached = self.nbrs.copy()
-        # emitters = {msg.id for msg in self.rcv_messages}
         # 将所有的msg.emitters合并到一个集合中
         emitters = set()
         for msg in self.rcv_messages:
             emitters.update(msg.emitters)
 
-        for emitter in emitters:
-            for nbr in list(not_reached):
-                if simu.distance[nbr][emitter] < R_min:
-                    not_reached.remove(nbr)
-
-        return len(not_reached) > alpha * len(self.nbrs)
+        # slot 开始时已批量评估过；同一 slot 中先超时的节点可能修改了共享的 msg.emitters，此时重新评估
+        decided = simu.relay_decisions.get(self.id)
+        if decided is not None and decided[0] == emitters:
+            return decided[1]
+        return simu.evaluate_positions([self.id], [emitters])[0]
     
     def on_timeout(self):
         do_relay = self.evaluate_positions()
@@ -73,11 +89,13 @@ class Node:
         # 如果有消息需要转发，则发送消息；否则使用接收到的消息
         # 先除去当前slot收到的消息，再取最后一个消息
         while self.rcv_messages and self.rcv_messages[-1].slot == simu.slot:
-            print(f"Node {self.id} remove message, msg id: {self.rcv_messages[-1].id} ttl: {self.rcv_messages[-1].ttl}, slot: {self.rcv_messages[-1].slot}")
+            if tracer.level >= event_trace.DEBUG:
+                tracer.emit(simu.slot, self.id, event_trace.DROP, self.rcv_messages[-1].id)
             self.rcv_messages.pop()
 
         msg = self.rcv_messages[-1] if self.rcv_messages else self.message
-        print(f"Node {self.id} timeout")
+        if tracer.level:
+            tracer.emit(simu.slot, self.id, event_trace.TIMEOUT)
         if msg: 
             if do_relay and msg.ttl > 0:
                 msg = self.update_message(msg)
@@ -85,6 +103,8 @@ class Node:
             self.state = 'R'
         else:
             print(f"Node {self.id} timeout, no message to relay, error with timer")
+            # 仍为 I，下一个 slot 再次超时
+            heapq.heappush(simu.timers, (self.timer, self.id))
         
     def update_message(self, msg):
         msg.id = self.id
@@ -94,15 +114,19 @@ class Node:
         return msg
 
     def relay_message(self, msg):
-        print(f"Node {self.id} relay message, msg id: {msg.id} ttl: {msg.ttl} msg slot: {msg.slot}")
-        for i in range(n):
-            if self.id != i and simu.distance[self.id][i] < R:
-                print(f"from {self.id} to {i}")
-                simu.rcv_set[i] = msg
+        if tracer.level:
+            tracer.emit(simu.slot, self.id, event_trace.SEND, value=msg.ttl)
+        nbrs = simu.nbr_index.neighbors(self.id)
+        if tracer.level >= event_trace.DEBUG:
+            tracer.emit_many(simu.slot, np.full(len(nbrs), self.id), event_trace.DELIVER, nbrs)
+        for i in nbrs.tolist():
+            simu.rcv_set[i] = msg
+            simu.notify(i)
 
     def node_process(self, slot, rcv_set):
         # 如果节点在rcv_set中，说明在上一个slot中收到了消息，其中rsv_set中是key: id, value: message的形式
-        print(f"timer {self.timer} slot {slot} state {self.state}")
+        if tracer.level >= event_trace.DEBUG:
+            tracer.emit(slot, self.id, event_trace.TIMER, value=self.timer)
         if self.timer <= slot and self.state == 'I':
             self.on_timeout()
         elif self.id in rcv_set:
@@ -127,19 +151,38 @@ class Simu:
         self.nodes[0].message = Message(0)
         self.init_distance()
         # calc nbrs of node
-        for i in range(n):
-            for j in range(n):
-                if i != j and self.distance[i][j] < R:
-                    self.nodes[i].nbrs.add(j)
+        for node, nbrs in zip(self.nodes, self.nbr_index.neighbor_sets()):
+            node.nbrs = nbrs
         # 以key: id, value: message的形式存储节点收到的消息
         self.rcv_set = {}
+        # 邻居集合和覆盖集合（距离 < R_min 的节点，包括自身）的位图，见 bitset.py
+        self.nbr_bits = bitset.pack(self.nbr_index)
+        if R_min == R:
+            cover_index = self.nbr_index
+        elif SPEED:
+            # 保存自己的一份位置，move 时与 nbr_index 使用相同的新位置
+            cover_index = cell_list.CellList(self.nbr_index.x, self.nbr_index.y, R_min)
+        else:
+            cover_index = neighbor_index.NeighborIndex(self.nbr_index.x, self.nbr_index.y, R_min)
+        self.cover_bits = bitset.pack(cover_index, include_self=True)
+        self.cover_index = cover_index
+        self.degree = self.nbr_index.degree()
+        if SPEED:
+            speed = np.random.uniform(0, SPEED, n)
+            angle = np.random.uniform(0, 2 * np.pi, n)
+            self.vx, self.vy = speed * np.cos(angle), speed * np.sin(angle)
+        # 本 slot 超时节点的评估结果，key: id, value: (emitters, do_relay)
+        self.relay_decisions = {}
+        # 定时器堆：(到期 slot, id)，节点变为 I 时加入，每个 slot 只取出到期的节点
+        self.timers = [(self.nodes[0].timer, 0)]
+        # 本 slot 待处理节点的堆：(slot 开始时的状态编码, id)，即 I -> S -> R、组内按 id 升序；current 为正在处理的节点
+        self.queue = []
+        self.current = (-1, -1)
 
         # 以key:state, value: nodes的形式存储节点
         # nodes的存储方式以set的形式存储，方便节点的增删
-        self.state_nodes = {'I': set(), 'S': set(), 'R': set()}
-        self.new_nodes = {'I': set(), 'S': set(), 'R': set()}
-        for node in self.nodes:
-            self.state_nodes[node.state].add(node.id)
+        # 状态只在发生变化时更新（见 state_tracker.py）
+        self.state_nodes = StateTracker('ISR', [node.state for node in self.nodes])
 
         self.annot = ax.annotate("", xy=(0,0), xytext=(20,20), textcoords="offset points",
                                  bbox=dict(boxstyle="round", fc="w"),
@@ -153,10 +196,9 @@ class Simu:
     #         self.nodes.append(Node(i, random.uniform(0, D), random.uniform(0, D), 'I'))
     
     def init_distance(self):
-        self.distance = np.zeros((n, n))
-        for i in range(n):
-            for j in range(n):
-                self.distance[i][j] = np.sqrt((self.nodes[i].x - self.nodes[j].x) ** 2 + (self.nodes[i].y - self.nodes[j].y) ** 2)
+        # 只保存距离 < R 的邻居（CSR），不再构建 n*n 的 distance 矩阵；节点移动时用 cell list 增量维护
+        x, y = [node.x for node in self.nodes], [node.y for node in self.nodes]
+        self.nbr_index = cell_list.CellList(x, y, R) if SPEED else neighbor_index.NeighborIndex(x, y, R)
 
     def update_annot(self, node):
         self.annot.xy = (node.x, node.y)
@@ -180,10 +222,49 @@ class Simu:
                 self.annot.set_visible(False)
                 self.ax.figure.canvas.draw_idle()
 
+    def evaluate_positions(self, node_ids, emitters):
+        """批量评估：未被任何 emitter 覆盖的邻居数 > alpha * 邻居数 时转发"""
+        left = bitset.uncovered(self.nbr_bits, self.cover_bits, node_ids, [list(e) for e in emitters])
+        return (left > alpha * self.degree[node_ids]).tolist()
+
+    def evaluate_timeouts(self, due):
+        """本 slot 中会超时的 I 节点（timer <= slot）一次评估"""
+        emitters = []
+        for i in due:
+            e = set()
+            for msg in self.nodes[i].rcv_messages:
+                e.update(msg.emitters)
+            emitters.append(e)
+        self.relay_decisions = dict(zip(due, zip(emitters, self.evaluate_positions(due, emitters))))
+
+    def notify(self, node_id):
+        """node_id 收到消息：本 slot 中还没有轮到它时加入队列，否则留在 rcv_set 中，下一个 slot 处理"""
+        key = (int(self.state_nodes.state[node_id]), node_id)
+        if key > self.current:
+            heapq.heappush(self.queue, key)
+
+    def move(self):
+        """所有节点移动一步，按邻居的增量修补 nbrs（与 nbr_index 共享集合）、degree 和位图"""
+        x = self.nbr_index.x + self.vx
+        y = self.nbr_index.y + self.vy
+        # 在边界反射
+        for pos, v in ((x, self.vx), (y, self.vy)):
+            out = (pos < 0) | (pos > D)
+            pos[out] = np.where(pos[out] < 0, -pos[out], 2 * D - pos[out])
+            v[out] = -v[out]
+        ids = np.arange(n)
+        added, removed = self.nbr_index.move(ids, x, y)
+        bitset.update(self.nbr_bits, added, removed)
+        if self.cover_index is not self.nbr_index:
+            added, removed = self.cover_index.move(ids, x, y)
+        bitset.update(self.cover_bits, added, removed)
+        for node, xi, yi in zip(self.nodes, x.tolist(), y.tolist()):
+            node.x, node.y = xi, yi
+
     def process_node(self, node_id):
         """处理单个节点状态转换并更新状态字典"""
         state = self.nodes[node_id].node_process(self.slot, self.rcv_set)
-        self.new_nodes[state].add(node_id)
+        self.state_nodes.record(node_id, state)
 
         return state
 
@@ -202,26 +283,37 @@ class Simu:
     # 每次点击模拟一个slot，每个round有2 * c * c个slot
     def run(self):
         # 每次点击模拟一个slot
-        for state in ['I', 'S', 'R']:
-            for node_id in self.state_nodes[state]:
-                cstate = self.process_node(node_id)
-                self.new_nodes[cstate].add(node_id)
+        # 只处理定时器到期或收到消息的节点，其余节点在这个 slot 中什么也不做；
+        # 处理顺序与按 I -> S -> R、组内 id 升序遍历所有节点相同（StateTracker 的状态编码即为这个顺序）
+        due = []
+        while self.timers and self.timers[0][0] <= self.slot:
+            due.append(heapq.heappop(self.timers)[1])
+        due.sort()
+        self.evaluate_timeouts(due)
+
+        self.queue = [(int(self.state_nodes.state[i]), i) for i in set(due) | self.rcv_set.keys()]
+        heapq.heapify(self.queue)
+        visited = set()
+        while self.queue:
+            key = heapq.heappop(self.queue)
+            if key[1] in visited:
+                continue
+            visited.add(key[1])
+            self.current = key
+            self.process_node(key[1])
+        self.current = (-1, -1)
 
-        self.state_nodes = copy.deepcopy(self.new_nodes)
-        self.new_nodes = {'I': set(), 'S': set(), 'R': set()}
+        self.state_nodes.commit()
 
         self.slot += 1
 
         # 如果不移动，不需要下面的计算
-        # for i in range(n):
-        #     for j in range(i + 1, n):
-        #         if i != j and self.distance[i][j] < R:
-        #             self.nodes[i].nbrs.add(j)
-        #             self.nodes[j].nbrs.add(i)
+        if SPEED:
+            self.move()
 
         # 打印每个状态的节点数量
         for state in ['I', 'S', 'R']:
-            print(f"State {state}: {len(self.state_nodes[state])}")
+            print(f"State {state}: {self.state_nodes.count[state]}")
 
         self.visualize()
 
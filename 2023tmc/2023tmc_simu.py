@@ -41,12 +41,19 @@
 # A node in state S means that the node does not need to deliver the source message since some other nodes
 # in the same cell will do that. Nodes in S do nothing in the subsequent rounds.
 
+import os
+import sys
 import numpy as np
 import random
 import math
 import matplotlib.pyplot as plt
 import time
-import copy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import neighbor_index
+import event_trace
+from state_tracker import StateTracker
+from receive_buffer import ReceiveBuffer
 
 # Parameters 
 # input
@@ -65,6 +72,9 @@ c = 10
 # zeta = {0, 1, 3, 5, 7, 9} * 10 ** (-1)
 # T_zeta = {0, 1, 2, 3, 4, 5} * 10
 
+# 事件记录级别：event_trace.OFF / INFO / DEBUG，记录保存在 tracer 的环形缓冲区中（见 event_trace.py）
+TRACE_LEVEL = event_trace.OFF
+
 # calc
 cell_size = epsilon * R / (2 * np.sqrt(2))
 
@@ -79,6 +89,8 @@ c_cal = np.ceil(
 
 print(f"cell_size: {cell_size}, c_cal: {c_cal}")
 
+tracer = event_trace.Tracer(TRACE_LEVEL)
+
 # 设置随机种子以便结果可复现
 # random.seed(time.time())
 # 设置固定的随机种子
@@ -94,7 +106,6 @@ class Node:
         self.cell_id = (x // cell_size, y // cell_size)
         self.state = state
         self.message = msg
-        self.inbox = []
         self.color = c * (self.cell_id[0] % c) + (self.cell_id[1] % c)
         self.cnt = 0
         self.recv = False
@@ -102,29 +113,27 @@ class Node:
     # 节点每个时间单位的处理，定义返回值为state，表示节点的状态
     def node_process(self, slot):
         # print(f"Node {self.id} with state {self.state}")
-        pstate = self.state
         if self.state == 'I':
             # if receive M_v in the first c * c slots
-            if slot < c * c and self.inbox:
-                msg = self.inbox.pop()
-                self.inbox.clear()
+            if slot < c * c and simu.rx.count[self.id]:
+                msg, same_cell = self.read_inbox()
                 # 如果两者的cell相同
-                if msg.cell_id == self.cell_id:
+                if same_cell:
                     self.state = 'S'
                 else:
                     self.message = Message(msg.content, self.id, self.cell_id)
                     self.state = 'A'
 
-                print(f"Node {self.id} received message from cell {msg.cell_id} recv {len(self.inbox)}, {pstate} turn to {self.state}")
+                if tracer.level:
+                    tracer.emit(simu.round * 2 * c * c + slot, self.id, event_trace.RECV, msg.id)
 
         elif self.state == 'S':
             # do nothing
             pass
         elif self.state == 'A':
-            if slot < c * c and self.inbox:
-                    msg = self.inbox.pop()
-                    self.inbox.clear()
-                    if msg.cell_id == self.cell_id:
+            if slot < c * c and simu.rx.count[self.id]:
+                    msg, same_cell = self.read_inbox()
+                    if same_cell:
                         self.cnt = 0
                         self.state = 'S'
                     else:
@@ -134,10 +143,9 @@ class Node:
                 if random.random() < p:
                     self.broadcast()
                 else:
-                    if self.inbox:
-                        msg = self.inbox.pop()
-                        self.inbox.clear()
-                        if msg.cell_id == self.cell_id:
+                    if simu.rx.count[self.id]:
+                        msg, same_cell = self.read_inbox()
+                        if same_cell:
                             self.cnt = 0
                             self.state = 'S'
 
@@ -155,15 +163,23 @@ class Node:
 
         return self.state
 
+    def read_inbox(self):
+        """读取并清空接收缓冲区，返回 (最后一条消息, 其发送方是否与自己在同一个 cell)，见 receive_buffer.py"""
+        same_cell = simu.rx.cell[self.id] == simu.cell_key[self.id]
+        _, sender = simu.rx.take(self.id)
+        return simu.nodes[sender].message, same_cell
+
     def broadcast(self):
-        print(f"Node {self.id} broadcast message")
-        for i in range(n):
-            if self.id != i and simu.distance[self.id][i] < R:
-                simu.nodes[i].inbox.append(self.message)
+        if tracer.level:
+            tracer.emit(simu.round * 2 * c * c + simu.slot, self.id, event_trace.SEND)
+        nbrs = simu.nbr_index.neighbors(self.id)
+        simu.rx.deliver(self.id, nbrs)
+        simu.pending.update(nbrs.tolist())
 
 class Message:
     def __init__(self, content, id, cell_id):
         self.content = content + "->" + str(id)
+        self.id = id
         self.cell_id = cell_id
 
 class Simu:
@@ -176,13 +192,22 @@ class Simu:
         self.nodes[0].state = 'B'
         self.nodes[0].message = Message('0', 0, self.nodes[0].cell_id)
         self.init_distance()
+        # cell_id 编号为整数，接收缓冲区同时记录发送方的 cell
+        cells = {cell: k for k, cell in enumerate(sorted({node.cell_id for node in self.nodes}))}
+        self.cell_key = np.array([cells[node.cell_id] for node in self.nodes], dtype=np.int64)
+        self.rx = ReceiveBuffer(n, self.cell_key)
 
         # 以key:state, value: nodes的形式存储节点
         # nodes的存储方式以set的形式存储，方便节点的增删
-        self.state_nodes = {'I': set(), 'A': set(), 'B': set(), 'S': set()}
-        self.new_nodes = {'I': set(), 'A': set(), 'B': set(), 'S': set()}
-        for node in self.nodes:
-            self.state_nodes[node.state].add(node.id)
+        # 状态只在发生变化时更新（见 state_tracker.py）
+        self.state_nodes = StateTracker('IABS', [node.state for node in self.nodes])
+
+        # 按节点可能行动的 slot 分桶：B 节点在 slot color 广播，A 节点在 slot c * c + color 广播或监听
+        self.buckets = [set() for _ in range(2 * c * c)]
+        for node_id in self.state_nodes['B'] | self.state_nodes['A']:
+            self.buckets[self.act_slot(self.nodes[node_id])].add(node_id)
+        # inbox 非空的节点，I、A 节点只在前 c * c 个 slot 中读取 inbox
+        self.pending = set()
 
         self.annot = ax.annotate("", xy=(0,0), xytext=(20,20), textcoords="offset points",
                                  bbox=dict(boxstyle="round", fc="w"),
@@ -197,10 +222,8 @@ class Simu:
             self.nodes.append(Node(i, random.uniform(0, D), random.uniform(0, D), 'I'))
     
     def init_distance(self):
-        self.distance = np.zeros((n, n))
-        for i in range(n):
-            for j in range(n):
-                self.distance[i][j] = np.sqrt((self.nodes[i].x - self.nodes[j].x) ** 2 + (self.nodes[i].y - self.nodes[j].y) ** 2)
+        # 只保存距离 < R 的邻居（CSR），不再构建 n*n 的 distance 矩阵
+        self.nbr_index = neighbor_index.NeighborIndex([node.x for node in self.nodes], [node.y for node in self.nodes], R)
 
     def update_annot(self, node):
         self.annot.xy = (node.x, node.y)
@@ -235,10 +258,51 @@ class Simu:
             self.ax.scatter(node.x, node.y, color=colors[node.state])
         plt.draw()
 
+    def act_slot(self, node):
+        return int(node.color) if node.state == 'B' else c * c + int(node.color)
+
     def process_node(self, node_id):
-        """处理单个节点状态转换并更新状态字典"""
-        state = self.nodes[node_id].node_process(self.slot)
-        self.new_nodes[state].add(node_id)
+        """处理单个节点状态转换并更新状态字典和分桶"""
+        node = self.nodes[node_id]
+        pstate = node.state
+        if pstate in ('A', 'B'):
+            act = self.act_slot(node)
+        state = node.node_process(self.slot)
+        if state != pstate:
+            self.state_nodes.record(node_id, state)
+            if pstate in ('A', 'B'):
+                self.buckets[act].discard(node_id)
+            if state in ('A', 'B'):
+                self.buckets[self.act_slot(node)].add(node_id)
+
+    # 处理一个 slot，只访问这个 slot 中可能有动作的节点，与按 B -> A -> I -> S 遍历所有节点的结果相同：
+    # 前 c * c 个 slot：bucket 中的 B 节点广播，然后 inbox 非空的 A、I 节点读取
+    # 后 c * c 个 slot：bucket 中的 A 节点广播或监听；最后一个 slot 所有 A 节点计数
+    # 没有节点可以行动的 slot 直接跳过
+    def step(self):
+        if self.slot < c * c:
+            for node_id in sorted(self.buckets[self.slot]):
+                self.process_node(node_id)
+            if self.pending:
+                readers = {'A': [], 'I': []}
+                for node_id in sorted(self.pending):
+                    node = self.nodes[node_id]
+                    if self.rx.count[node_id] and node.state in readers:
+                        readers[node.state].append(node_id)
+                for node_id in readers['A'] + readers['I']:
+                    self.process_node(node_id)
+                self.pending.clear()
+        elif self.slot == 2 * c * c - 1:
+            for node_id in self.state_nodes.snapshot('A'):
+                self.process_node(node_id)
+        else:
+            for node_id in sorted(self.buckets[self.slot]):
+                self.process_node(node_id)
+
+        self.state_nodes.commit()
+        self.slot += 1
+        self.round += self.slot // (2 * c * c)
+        self.slot %= (2 * c * c)
 
     # 运行模拟
     # 每次点击模拟一个slot，每个round有2 * c * c个slot
@@ -266,19 +330,11 @@ class Simu:
         # 每次点击模拟一个round
         for _ in range(2 * c * c):
             # 每次点击模拟一个slot
-            for state in ['B', 'A', 'I', 'S']:  # 这里假设只有这三种状态需要处理
-                for node_id in list(self.state_nodes[state]):  # 转换为列表以防在迭代时修改集合
-                    self.process_node(node_id)
-
-            self.state_nodes = copy.deepcopy(self.new_nodes)
-            self.new_nodes = {'I': set(), 'A': set(), 'B': set(), 'S': set()}
-            self.slot += 1
-            self.round += self.slot // (2 * c * c)
-            self.slot %= (2 * c * c)
+            self.step()
 
         # 打印每个状态的节点数量
         for state in ['I', 'A', 'B', 'S']:
-            print(f"State {state}: {len(self.state_nodes[state])}")
+            print(f"State {state}: {self.state_nodes.count[state]}")
 
         self.visualize()
         print(f"slot {self.slot} round {self.round}")
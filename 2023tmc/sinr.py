@@ -0,0 +1,120 @@
+# SINR 接收模型（2023 TMC）
+# 节点 u 能解码发送方 v 的消息，当且仅当
+#   SINR = P_v * d(v, u) ** (-alpha) / (N + sum_{w in T, w != v} P_w * d(w, u) ** (-alpha)) >= beta
+# 每个 slot 对所有 listener 做一次向量化计算：
+#   近场：边长为 cutoff 的粗网格中，listener 周围 3x3 个格子内的发送方精确求和
+#   远场：更远的发送方按四叉树逐层聚合，每个格子的总功率放在功率加权质心处。
+#         第 k 层的格子边长为 cutoff * 2^k，listener 在第 k 层计入父格子 5x5 邻域的子格子中、
+#         不在自己邻域内（第 0 层为 3x3，之后为 5x5）的格子，更远的留给上一层，每个发送方恰好计入一次，
+#         每个 listener 的代价为 O(log C)（C 为有发送方的格子数），原来逐格子求和为 O(C)。
+#         第 1 层起聚合格子与 listener 至少相隔 2 个格子，误差与单层逐格子聚合相当：
+#         判决结果与逐对精确计算相比，约 2000~2850 个 listener 中差 0~4 个（单层为 0~3 个）。
+
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from neighbor_index import expand
+
+# far_field 每批处理的 listener 数
+BATCH = 4096
+
+
+class SINRModel:
+    def __init__(self, x, y, alpha, beta, N, power, cutoff=None):
+        """
+        power: 发送功率，标量或每个节点一个值（在 [P_min, P_max] 内）
+        cutoff: 近场半径，默认取无干扰时的最大接收距离 (P_max / (beta * N)) ** (1 / alpha)，
+                更远的发送方不可能被解码，只作为干扰计入
+        """
+        self.x, self.y = x, y
+        self.n = len(x)
+        self.alpha, self.beta, self.N = alpha, beta, N
+        self.power = np.broadcast_to(np.asarray(power, dtype=float), (self.n,))
+        if cutoff is None:
+            cutoff = (self.power.max() / (beta * N)) ** (1 / alpha)
+        self.cutoff = cutoff
+
+        gx = np.floor(x / cutoff).astype(np.int64)
+        gy = np.floor(y / cutoff).astype(np.int64)
+        self.ny = gy.max() + 3
+        self.key = (gx + 1) * self.ny + (gy + 1)
+
+    def cell_xy(self, key):
+        return key // self.ny - 1, key % self.ny - 1
+
+    def far_field(self, tx, tkey, listeners):
+        """listener 所在格子之外（非 3x3 相邻）的发送方干扰，按四叉树逐层聚合近似"""
+        p = self.power[tx]
+        # 格子坐标（非负），第 k 层为右移 k 位
+        ta, tb = tkey // self.ny, tkey % self.ny
+        lkey = self.key[listeners]
+        la, lb = lkey // self.ny, lkey % self.ny
+        top = int(max(ta.max(), tb.max(), la.max(), lb.max()))
+        width = self.ny + 8
+        # 父格子 5x5 邻域的 10x10 个子格子相对 2 * 父格子坐标的偏移
+        d = np.arange(-4, 6)
+        ox, oy = np.repeat(d, 10), np.tile(d, 10)
+
+        interference = np.zeros(len(listeners))
+        k, r = 0, 1
+        # 第 k 层跳过距离 <= r 个格子的邻域（第 0 层为近场的 3x3，之后为 5x5）；所有格子都在邻域内时不再有远场
+        while top >> k > r:
+            ukey, inv = np.unique(((ta >> k) + 4) * width + (tb >> k) + 4, return_inverse=True)
+            pc = np.bincount(inv, weights=p)
+            cx = np.bincount(inv, weights=p * self.x[tx]) / pc
+            cy = np.bincount(inv, weights=p * self.y[tx]) / pc
+            # 邻域之外的偏移只取决于 listener 在父格子中的位置 (a & 1, b & 1)
+            far = np.array([[(np.abs(ox - i) > r) | (np.abs(oy - j) > r) for j in (0, 1)] for i in (0, 1)])
+            for start in range(0, len(listeners), BATCH):
+                a, b = la[start:start + BATCH] >> k, lb[start:start + BATCH] >> k
+                ck = ((a >> 1 << 1) + 4)[:, None] * width + (b >> 1 << 1)[:, None] + (4 + ox * width + oy)[None, :]
+                pos = np.minimum(np.searchsorted(ukey, ck), len(ukey) - 1)
+                row, col = np.nonzero(far[a & 1, b & 1] & (ukey[pos] == ck))
+                c = pos[row, col]
+                l = listeners[start + row]
+                dist = np.sqrt((self.x[l] - cx[c]) ** 2 + (self.y[l] - cy[c]) ** 2)
+                interference[start:start + BATCH] += np.bincount(row, weights=pc[c] * np.maximum(dist, 1e-12) ** (-self.alpha), minlength=len(a))
+            k, r = k + 1, 2
+        return interference
+
+    def receive(self, senders, listeners):
+        """返回长度为 n 的数组：每个 listener 解码出的发送方，没有则为 -1"""
+        got = np.full(self.n, -1, dtype=np.int64)
+        if senders.size == 0 or listeners.size == 0:
+            return got
+
+        order = np.argsort(self.key[senders], kind='stable')
+        tx = senders[order]
+        tkey = self.key[tx]
+
+        # 近场：listener 周围 3x3 个格子内的所有发送方
+        ls, ts = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                k = self.key[listeners] + dx * self.ny + dy
+                lo = np.searchsorted(tkey, k, side='left')
+                hi = np.searchsorted(tkey, k, side='right')
+                cnt = hi - lo
+                ls.append(np.repeat(listeners, cnt))
+                ts.append(tx[expand(lo, cnt)])
+        l = np.concatenate(ls)
+        t = np.concatenate(ts)
+        keep = l != t
+        l, t = l[keep], t[keep]
+
+        d = np.sqrt((self.x[l] - self.x[t]) ** 2 + (self.y[l] - self.y[t]) ** 2)
+        sig = self.power[t] * np.maximum(d, 1e-12) ** (-self.alpha)
+        total = np.bincount(l, weights=sig, minlength=self.n)
+        best = np.zeros(self.n)
+        np.maximum.at(best, l, sig)
+        strongest = np.full(self.n, -1, dtype=np.int64)
+        is_best = sig == best[l]
+        strongest[l[is_best]] = t[is_best]
+
+        signal = best[listeners]
+        interference = total[listeners] - signal + self.far_field(tx, tkey, listeners)
+        ok = (signal > 0) & (signal >= self.beta * (self.N + interference))
+        got[listeners[ok]] = strongest[listeners[ok]]
+        return got
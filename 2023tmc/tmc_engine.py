@@ -0,0 +1,279 @@
+# 2023 TMC 仿真（Jamming-Resilient Message Dissemination）的向量化引擎
+# 节点状态（I/A/B/S、color、cnt、recv、cell id）保存在 NumPy 数组中，每个 slot 用布尔掩码一次处理所有节点。
+# 状态转换与 2023tmc_simu.py 中的 Simu.run 一致：同一种子下，位置、随机数的消耗顺序以及每个 slot 的状态都相同。
+# 对应关系：
+#   Simu.run 每个 slot 按 B -> A -> I -> S、组内按 id 升序处理节点
+#   inbox.pop() 取最后一条消息 -> 数组 inbox 中保存最后一条消息的发送方 cell 编号，-1 表示空
+
+import os
+import sys
+import numpy as np
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import neighbor_index
+import event_trace
+from sinr import SINRModel
+
+# Parameters（与 2023tmc_simu.py 保持一致）
+# D = {150, 200, 250, 300}
+D = 150
+n = 1000
+R = 30
+alpha = 3
+beta = 1.5
+P_min = R ** alpha * beta
+P_max = 4 * R ** alpha * beta
+epsilon = 1.0
+N = P_min / ((1 + epsilon) ** alpha * R ** alpha * beta)
+p = 0.2
+c = 10
+k = 5  # A 状态持续 k * (log(n) + log(R)) 轮后变为 B
+# zeta = {0, 1, 3, 5, 7, 9} * 10 ** (-1)
+# T_zeta = {0, 1, 2, 3, 4, 5} * 10
+
+# 状态编码
+I, A, B, S = 0, 1, 2, 3
+STATES = 'IABS'
+
+
+def jam_mask(rounds, zeta, T_zeta=None, rng=None):
+    """
+    Regular Jamming (REGJ)：每个 round 以概率 zeta 被干扰，返回长度为 rounds 的布尔数组
+    T_zeta: 干扰者的预算，最多干扰 T_zeta 个 round（仿真中大约出现 T_zeta 个干扰 round）
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    mask = rng.random(rounds) < zeta
+    if T_zeta is not None:
+        mask[np.flatnonzero(mask)[T_zeta:]] = False
+    return mask
+
+
+class VecSimu:
+    def __init__(self, D=D, n=n, R=R, c=c, p=p, epsilon=epsilon, k=k, seed=None, rng=None,
+                 reception='disk', alpha=alpha, beta=beta, N=N, power=P_min, cutoff=None, jam=None, tracer=None, replicas=1,
+                 topology=None):
+        """
+        seed: 设置 Python random 的种子，节点位置和发送判决按 Simu 的顺序从 random 中抽取
+        rng: 传入 np.random.Generator 时改用其批量抽取（更快，但不再与 Simu 逐 slot 对应）
+        reception: 'disk' 为 Simu 的 distance < R 模型；'sinr' 按 alpha/beta/N 和发送功率 power 计算 SINR，
+                   同一 slot 内的发送同时发生，发送方不接收，cutoff 之外的干扰按格子近似（见 sinr.py）
+        jam: 每个 round 是否被干扰的布尔数组（见 jam_mask），被干扰的 round 内所有节点都收不到消息；
+             多个副本时可以是 (replicas, rounds) 的数组，每个副本各自被干扰
+        tracer: event_trace.Tracer，开启时每个 slot 批量记录发送事件
+        replicas: 同时推进的独立副本数 K。各副本的节点拼接成长度为 K * n 的数组（副本 r 的节点 i 编号为 r * n + i），
+                  邻接为块对角，每个 slot 用同一组向量化运算更新所有副本，随机数也一次抽取。
+                  K > 1 时需要 rng（没有时用 seed 创建），只支持 'disk' 接收模型
+        topology: 已构建的 n 个节点的 NeighborIndex（可以是 shared_topology.attach 得到的共享内存视图），
+                  给定时不再抽取位置、构建邻居，只有发送判决和干扰是随机的；多个副本共用这一拓扑
+        """
+        self.D, self.n, self.R, self.c, self.p = D, n, R, c, p
+        self.replicas = replicas
+        self.size = replicas * n
+        self.cell_size = epsilon * R / (2 * np.sqrt(2))
+        self.threshold = k * (np.log(n) + np.log(R))
+        if replicas > 1:
+            if reception != 'disk':
+                raise ValueError("replicas > 1 only supports reception='disk'")
+            if rng is None:
+                rng = np.random.default_rng(seed)
+        self.rng = rng
+        jam = np.zeros((replicas, 0), dtype=bool) if jam is None else np.asarray(jam, dtype=bool)
+        self.jam = np.broadcast_to(jam, (replicas, jam.shape[-1]))
+        self.tracer = event_trace.Tracer() if tracer is None else tracer
+        self.slot = 0
+        self.round = 0
+
+        if seed is not None:
+            random.seed(seed)
+        if topology is not None:
+            if topology.n != n or topology.R != R:
+                raise ValueError(f"topology has n={topology.n}, R={topology.R}, expected n={n}, R={R}")
+            self.x = np.tile(topology.x, replicas)
+            self.y = np.tile(topology.y, replicas)
+        elif rng is None:
+            # 与 Simu.__init__ 相同的抽取顺序：每个节点依次抽 x, y
+            xy = np.array([(random.uniform(0, D), random.uniform(0, D)) for _ in range(n)])
+            self.x, self.y = xy[:, 0].copy(), xy[:, 1].copy()
+        else:
+            self.x = rng.uniform(0, D, self.size)
+            self.y = rng.uniform(0, D, self.size)
+
+        # floor_divide 与 Python 的 // 语义一致
+        cx = np.floor_divide(self.x, self.cell_size).astype(np.int64)
+        cy = np.floor_divide(self.y, self.cell_size).astype(np.int64)
+        # 不同副本的 cell 编号互不相同
+        replica = np.arange(self.size) // n
+        self.cell = (replica * (cx.max() + 1) + cx) * (cy.max() + 1) + cy
+        self.color = c * (cx % c) + (cy % c)
+
+        # 每个副本的 0 号节点为源节点
+        self.state = np.full(self.size, I, dtype=np.int8)
+        self.state[::n] = B
+        self.cnt = np.zeros(self.size, dtype=np.int64)
+        self.recv = np.zeros(self.size, dtype=bool)
+        self.inbox = np.full(self.size, -1, dtype=np.int64)
+
+        if topology is None:
+            self.init_neighbors()
+        elif replicas == 1:
+            self.nbr_index = topology
+        else:
+            self.nbr_index = neighbor_index.stack([topology] * replicas)
+        if reception == 'sinr':
+            self.sinr = SINRModel(self.x, self.y, alpha, beta, N, power, cutoff)
+        elif reception == 'disk':
+            self.sinr = None
+        else:
+            raise ValueError(f"unknown reception {reception}")
+
+    def init_neighbors(self):
+        # CSR 邻接，只包含距离 < R 的节点对
+        if self.replicas == 1:
+            self.nbr_index = neighbor_index.NeighborIndex(self.x, self.y, self.R)
+        else:
+            self.nbr_index = neighbor_index.stack([
+                neighbor_index.NeighborIndex(self.x[r * self.n:(r + 1) * self.n], self.y[r * self.n:(r + 1) * self.n], self.R)
+                for r in range(self.replicas)])
+
+    def edges_from(self, senders):
+        """返回 senders 的所有 (发送方, 接收方) 对"""
+        return self.nbr_index.edges_from(senders)
+
+    def last_sender(self, src, dst):
+        """每个接收方最后收到的发送方（升序处理时即 id 最大者），没有则为 -1"""
+        last = np.full(self.size, -1, dtype=np.int64)
+        np.maximum.at(last, dst, src)
+        return last
+
+    def receive(self, senders, state):
+        """SINR 模式下，每个未发送的 A、I 节点解码出的发送方，没有则为 -1"""
+        listeners = np.flatnonzero((state == A) | (state == I))
+        listeners = listeners[~np.isin(listeners, senders)]
+        return self.sinr.receive(senders, listeners)
+
+    def jammed_replicas(self, r=None):
+        """第 r 个 round 中每个副本是否被干扰"""
+        r = self.round if r is None else r
+        if r < self.jam.shape[1]:
+            return self.jam[:, r]
+        return np.zeros(self.replicas, dtype=bool)
+
+    def jammed(self, r=None):
+        return bool(self.jammed_replicas(r).all())
+
+    def unjammed(self, senders, jammed):
+        """去掉被干扰副本中的发送方：它们照常发送，但没有节点能收到"""
+        return senders[~jammed[senders // self.n]]
+
+    def draw(self, size):
+        if self.rng is None:
+            return np.array([random.random() for _ in range(size)])
+        return self.rng.random(size)
+
+    # 处理一个 slot，对应 Simu.run 中一次 for 循环
+    def step(self):
+        c2 = self.c * self.c
+        s = self.slot
+        state = self.state
+        new_state = state.copy()
+        is_a = state == A
+        jammed = self.jammed_replicas()
+
+        if s < c2:
+            # B 节点在 slot == color 时广播，且先于 A、I 处理
+            senders = np.flatnonzero((state == B) & (self.color == s))
+            if self.tracer.level:
+                self.tracer.emit_many(self.round * 2 * c2 + s, senders, event_trace.SEND)
+            delivered = self.unjammed(senders, jammed)
+            if delivered.size:
+                if self.sinr is None:
+                    last = self.last_sender(*self.edges_from(delivered))
+                else:
+                    last = self.receive(delivered, state)
+                hit = last >= 0
+                self.inbox[hit] = self.cell[last[hit]]
+
+            # 前 c * c 个 slot 内，A、I 节点读取 inbox
+            readers = np.flatnonzero(((state == A) | (state == I)) & (self.inbox >= 0))
+            same = self.inbox[readers] == self.cell[readers]
+            a_readers = is_a[readers]
+            new_state[readers[same]] = S
+            self.cnt[readers[same & a_readers]] = 0
+            self.recv[readers[~same & a_readers]] = True
+            new_state[readers[~same & ~a_readers]] = A
+            self.inbox[readers] = -1
+        else:
+            # color 为 s - c * c 的 A 节点按 id 升序：以概率 p 广播，否则读取 inbox
+            acting = np.flatnonzero(is_a & (self.color == s - c2))
+            if acting.size:
+                tx = self.draw(acting.size) < self.p
+                listeners = acting[~tx]
+                if self.tracer.level:
+                    self.tracer.emit_many(self.round * 2 * c2 + s, acting[tx], event_trace.SEND)
+                delivered = self.unjammed(acting[tx], jammed)
+                if self.sinr is None:
+                    src, dst = self.edges_from(delivered)
+                    last = self.last_sender(src, dst)
+                    # 先于 listener 处理的发送方（id 更小）在其读取前已写入 inbox
+                    before = src < dst
+                    last_before = self.last_sender(src[before], dst[before])
+                else:
+                    # SINR 模式下同一 slot 的发送同时发生，listener 读取的就是本 slot 解码的消息
+                    last = last_before = self.receive(delivered, state)
+
+                msg = self.inbox[listeners].copy()
+                heard = last_before[listeners] >= 0
+                msg[heard] = self.cell[last_before[listeners[heard]]]
+                same = (msg >= 0) & (msg == self.cell[listeners])
+                new_state[listeners[same]] = S
+                self.cnt[listeners[same]] = 0
+
+                # 广播结束后的 inbox：listener 只保留读取之后（id 更大的发送方）的消息
+                hit = last >= 0
+                self.inbox[hit] = self.cell[last[hit]]
+                if self.sinr is None:
+                    after = last[listeners] > listeners
+                    self.inbox[listeners[~after]] = -1
+                else:
+                    self.inbox[listeners] = -1
+
+        # 每个 round 的最后一个 slot，A 节点计数，达到阈值后变为 B
+        if s == 2 * c2 - 1:
+            self.cnt[is_a] += 1
+            promote = is_a & (self.cnt >= self.threshold)
+            self.cnt[promote] = 0
+            self.recv[promote] = False
+            new_state[promote] = B
+
+        self.state = new_state
+        self.slot += 1
+        self.round += self.slot // (2 * c2)
+        self.slot %= (2 * c2)
+
+    # 模拟一个 round，每个 round 有 2 * c * c 个 slot
+    def run(self):
+        for _ in range(2 * self.c * self.c):
+            self.step()
+
+    def counts(self):
+        num = np.bincount(self.state, minlength=4)
+        return {st: int(num[i]) for i, st in enumerate(STATES)}
+
+    def counts_per_replica(self):
+        """(replicas, 4) 的数组，每行为一个副本中 I、A、B、S 的节点数"""
+        replica = np.arange(self.size) // self.n
+        num = np.bincount(replica * 4 + self.state, minlength=self.replicas * 4)
+        return num.reshape(self.replicas, 4)
+
+
+if __name__ == '__main__':
+    import time
+
+    simu = VecSimu(seed=42)
+    start = time.time()
+    # 没有 I、A 节点时传播结束
+    while simu.counts()['I'] + simu.counts()['A'] > 0 and simu.round < 200:
+        simu.run()
+        print(f"round {simu.round} {simu.counts()}")
+    print(f"elapsed {time.time() - start:.2f}s")
@@ -0,0 +1,149 @@
+# 2023 TMC 仿真在 Regular Jamming (REGJ) 下的 Monte Carlo
+# 对每个 (D, zeta) 点在进程池上运行 replicas 个独立副本（节点位置、发送判决和干扰 round 都来自各自的随机数流），
+# 统计传播结束轮数（I 节点数变为 0 的轮数）的均值和 95% 置信区间，结果写入 CSV。
+# batch > 1 时每个任务把 batch 个副本放进同一个 VecSimu（replicas=batch）一起推进，减少逐副本的 Python 开销；
+# 此时一个任务内的副本共用一个随机数流，结果与 batch = 1 时统计上等价但不逐位相同。
+# fixed_topology 为 True 时每个 D 只生成一次部署，发布到共享内存（shared_topology.py），
+# 工作进程零拷贝地连接，各副本只有发送判决和干扰不同。
+
+import csv
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+import tmc_engine
+import neighbor_index
+import shared_topology
+from tmc_sweep import run_until_done
+
+# Parameters
+D_values = [150, 200, 250, 300]
+zeta_values = [0, 0.1, 0.3, 0.5, 0.7, 0.9]
+T_zeta = None  # 干扰 round 的预算，None 表示不限制
+n = 1000
+replicas = 200
+batch = 1  # 每个任务同时推进的副本数
+fixed_topology = False  # 所有副本共用同一部署
+max_rounds = 500
+base_seed = 2023
+workers = os.cpu_count()
+out_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'res', 'tmc_montecarlo.csv')
+
+FIELDS = ['D', 'n', 'zeta', 'T_zeta', 'replicas', 'completed', 'mean', 'std', 'ci95_low', 'ci95_high', 'elapsed']
+
+
+# 工作进程中已连接的共享拓扑，按共享内存名字缓存，每个进程只连接一次
+attached = {}
+
+
+def topology(handle):
+    if handle is None:
+        return None
+    key = handle['arrays']['x'][0]
+    if key not in attached:
+        attached[key] = shared_topology.attach(handle)
+    return attached[key]
+
+
+def replica(D, zeta, seed_seq, handle=None, T_zeta=T_zeta):
+    """运行一个副本，返回结束轮数，没有结束（停滞或达到上限）时返回 None"""
+    topo_seq, jam_seq = seed_seq.spawn(2)
+    jam = tmc_engine.jam_mask(max_rounds, zeta, T_zeta, np.random.default_rng(jam_seq))
+    simu = tmc_engine.VecSimu(D=D, n=n, rng=np.random.default_rng(topo_seq), jam=jam, topology=topology(handle))
+    status, rounds, _ = run_until_done(simu, max_rounds)
+    return rounds
+
+
+def run_until_done_batch(simu, max_rounds=max_rounds):
+    """
+    与 tmc_sweep.run_until_done 相同的结束判定，分别作用于 simu 的每个副本，所有副本结束（done 或 stalled）或达到上限时返回，
+    返回每个副本的结束轮数列表，没有结束的为 None
+    """
+    K, n = simu.replicas, simu.n
+    rounds = np.full(K, -1)
+    settled = np.zeros(K, dtype=bool)
+    while simu.round < max_rounds and not settled.all():
+        before = simu.state.copy()
+        jammed = simu.jammed_replicas()
+        simu.run()
+        num = simu.counts_per_replica()
+        no_i, no_a = num[:, tmc_engine.I] == 0, num[:, tmc_engine.A] == 0
+        rounds[(rounds < 0) & no_i] = simu.round
+        unchanged = (simu.state == before).reshape(K, n).all(axis=1)
+        settled |= no_a & (no_i | (~jammed & unchanged))
+    return [int(r) if r >= 0 else None for r in rounds]
+
+
+def replica_batch(D, zeta, seed_seq, size, handle=None, T_zeta=T_zeta):
+    """在一个 VecSimu 中同时运行 size 个副本，返回各副本的结束轮数"""
+    topo_seq, jam_seq = seed_seq.spawn(2)
+    jam_rng = np.random.default_rng(jam_seq)
+    jam = np.array([tmc_engine.jam_mask(max_rounds, zeta, T_zeta, jam_rng) for _ in range(size)])
+    simu = tmc_engine.VecSimu(D=D, n=n, rng=np.random.default_rng(topo_seq), jam=jam, replicas=size,
+                              topology=topology(handle))
+    return run_until_done_batch(simu, max_rounds)
+
+
+def summarize(rounds):
+    done = np.array([r for r in rounds if r is not None], dtype=float)
+    if done.size == 0:
+        return dict(completed=0, mean=None, std=None, ci95_low=None, ci95_high=None)
+    mean = done.mean()
+    std = done.std(ddof=1) if done.size > 1 else 0.0
+    half = 1.96 * std / np.sqrt(done.size)
+    return dict(completed=int(done.size), mean=f"{mean:.3f}", std=f"{std:.3f}",
+                ci95_low=f"{mean - half:.3f}", ci95_high=f"{mean + half:.3f}")
+
+
+def publish_topologies(D_values, seq):
+    """每个 D 生成一次部署并发布到共享内存，返回 ({D: handle}, blocks)"""
+    handles, blocks = {}, []
+    for D, child in zip(D_values, seq.spawn(len(D_values))):
+        rng = np.random.default_rng(child)
+        index = neighbor_index.NeighborIndex(rng.uniform(0, D, n), rng.uniform(0, D, n), tmc_engine.R)
+        handles[D], shm = shared_topology.publish(index)
+        blocks += shm
+    return handles, blocks
+
+
+def montecarlo(D_values=D_values, zeta_values=zeta_values, replicas=replicas, path=out_path, batch=batch,
+               fixed_topology=fixed_topology, T_zeta=T_zeta):
+    points = [(D, zeta) for D in D_values for zeta in zeta_values]
+    # 每个点、每个副本一个独立的随机数流
+    seq = np.random.SeedSequence(base_seed)
+    seqs = seq.spawn(len(points))
+    handles, blocks = publish_topologies(D_values, seq.spawn(1)[0]) if fixed_topology else ({}, [])
+    try:
+        run_points(points, seqs, replicas, path, batch, handles, T_zeta)
+    finally:
+        shared_topology.release(blocks)
+
+
+def run_points(points, seqs, replicas, path, batch, handles, T_zeta=T_zeta):
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for (D, zeta), seq in zip(points, seqs):
+            start = time.time()
+            handle = handles.get(D)
+            if batch > 1:
+                sizes = [min(batch, replicas - i) for i in range(0, replicas, batch)]
+                children = seq.spawn(len(sizes))
+                rounds = [r for part in pool.map(replica_batch, [D] * len(sizes), [zeta] * len(sizes), children, sizes,
+                                                 [handle] * len(sizes), [T_zeta] * len(sizes))
+                          for r in part]
+            else:
+                children = seq.spawn(replicas)
+                rounds = list(pool.map(replica, [D] * replicas, [zeta] * replicas, children, [handle] * replicas,
+                                       [T_zeta] * replicas))
+            row = dict(D=D, n=n, zeta=zeta, T_zeta=T_zeta, replicas=replicas, elapsed=f"{time.time() - start:.3f}")
+            row.update(summarize(rounds))
+            writer.writerow(row)
+            f.flush()
+            print(f"D: {D:<4} zeta: {zeta:<4} completed: {row['completed']}/{replicas} "
+                  f"rounds: {row['mean']} [{row['ci95_low']}, {row['ci95_high']}]")
+
+
+if __name__ == '__main__':
+    montecarlo()
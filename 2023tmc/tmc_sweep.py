@@ -0,0 +1,91 @@
+# 2023 TMC 仿真的无界面批量运行
+# 不再依赖鼠标点击和绘图：对每组参数用 tmc_engine.VecSimu 连续运行 round，直到传播结束或停滞，
+# 把结束轮数和各状态的节点数写入结果文件（CSV，每列一个字段）。
+# 状态转换与 2023tmc_simu.py 的 Simu.run 相同，见 tmc_engine.py
+
+import csv
+import os
+import time
+import numpy as np
+import tmc_engine
+
+# Parameters
+D_values = [150, 200, 250, 300]
+zeta_values = [0, 0.1, 0.3, 0.5, 0.7, 0.9]
+T_zeta_values = [0, 10, 20, 30, 40, 50]
+n = 1000
+R = 30
+c = 10
+p = 0.2
+seeds = [42]
+reception = 'disk'
+max_rounds = 500
+out_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'res', 'tmc_sweep.csv')
+
+FIELDS = ['D', 'n', 'R', 'c', 'p', 'reception', 'zeta', 'T_zeta', 'seed', 'status', 'rounds', 'rounds_settled',
+          'jammed', 'I', 'A', 'B', 'S', 'elapsed']
+
+
+def run_until_done(simu, max_rounds=max_rounds):
+    """
+    按 round 运行直到：
+      done: 没有 I 节点（所有节点都收到了消息），继续运行到没有 A 节点为止
+      stalled: 还有 I 节点，但没有 A 节点且一个未被干扰的 round 内没有任何状态变化（此后只有 B 节点按固定 slot 广播，不会再变化）
+      max_rounds: 达到轮数上限
+    返回 (status, rounds, rounds_settled)，rounds 为 I 节点数变为 0 的轮数
+    """
+    rounds = None
+    while simu.round < max_rounds:
+        before = simu.state.copy()
+        jammed = simu.jammed()
+        simu.run()
+        counts = simu.counts()
+        if rounds is None and counts['I'] == 0:
+            rounds = simu.round
+        if counts['A'] == 0:
+            if counts['I'] == 0:
+                return 'done', rounds, simu.round
+            if not jammed and (simu.state == before).all():
+                return 'stalled', rounds, simu.round
+    return 'max_rounds', rounds, None
+
+
+def jam_points(zeta_values, T_zeta_values):
+    """
+    (zeta, T_zeta) 组合。zeta = 0 或 T_zeta = 0 时没有干扰 round，这些组合的结果都相同，只保留第一个
+    """
+    points, unjammed = [], False
+    for zeta in zeta_values:
+        for T_zeta in T_zeta_values:
+            if zeta == 0 or T_zeta == 0:
+                if unjammed:
+                    continue
+                unjammed = True
+            points.append((zeta, T_zeta))
+    return points
+
+
+def sweep(D_values=D_values, zeta_values=zeta_values, T_zeta_values=T_zeta_values, seeds=seeds, path=out_path, **kwargs):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for D in D_values:
+            for zeta, T_zeta in jam_points(zeta_values, T_zeta_values):
+                for seed in seeds:
+                    start = time.time()
+                    jam = tmc_engine.jam_mask(max_rounds, zeta, T_zeta, np.random.default_rng(seed))
+                    simu = tmc_engine.VecSimu(D=D, n=n, R=R, c=c, p=p, seed=seed, reception=reception, jam=jam, **kwargs)
+                    status, rounds, rounds_settled = run_until_done(simu)
+                    row = dict(D=D, n=n, R=R, c=c, p=p, reception=reception, zeta=zeta, T_zeta=T_zeta, seed=seed,
+                               status=status, rounds=rounds, rounds_settled=rounds_settled,
+                               jammed=int(jam[:simu.round].sum()), elapsed=f"{time.time() - start:.3f}")
+                    row.update(simu.counts())
+                    writer.writerow(row)
+                    f.flush()
+                    # T_zeta 可以为 None（不限制预算）
+                    print(f"D: {D:<4} zeta: {zeta:<4} T_zeta: {T_zeta!s:<4} seed: {seed:<4} {status:<10} "
+                          f"rounds: {rounds} settled: {rounds_settled} {simu.counts()}")
+
+
+if __name__ == '__main__':
+    sweep()
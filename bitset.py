@@ -0,0 +1,63 @@
+# 邻居集合的位图表示，用于中继覆盖评估
+# 每个节点的邻居集合压缩为一行 uint64（第 j 位表示节点 j），n 个节点共 n * ceil(n / 64) 个字。
+# 评估 "有多少邻居还没有被已发送的节点覆盖" 变为按位运算：
+#     popcount(nbrs[i] & ~(cover[e1] | cover[e2] | ...))
+# 取代逐个邻居、逐个发送方计算距离的 Python 循环；同一 slot 中所有需要评估的节点一次批量计算。
+
+import numpy as np
+
+# 按字节查表的 popcount，numpy 没有 bitwise_count 时使用
+BYTE_COUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+def popcount(bits):
+    """最后一维上置位的个数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bits).sum(axis=-1, dtype=np.int64)
+    return BYTE_COUNT[bits.view(np.uint8)].sum(axis=-1)
+
+
+def mask(cols):
+    """节点 cols 在所在字中的位"""
+    return np.left_shift(np.uint64(1), (cols & 63).astype(np.uint64))
+
+
+def pack(index, include_self=False):
+    """
+    NeighborIndex（或 CellList）中每个节点的邻居集合，返回 (n, words) 的 uint64 数组。
+    include_self 为 True 时节点自身也置位（覆盖集合：发送方自己也算被覆盖）
+    """
+    n = index.n
+    bits = np.zeros((n, (n + 63) // 64), dtype=np.uint64)
+    rows, cols = index.edges_from(np.arange(n))
+    if include_self:
+        rows = np.concatenate((rows, np.arange(n)))
+        cols = np.concatenate((cols, np.arange(n)))
+    np.bitwise_or.at(bits, (rows, cols >> 6), mask(cols))
+    return bits
+
+
+def update(bits, added, removed):
+    """按邻居对的增量修补位图：added、removed 为 (k, 2) 的数组（见 cell_list.CellList.move），两个方向都修改"""
+    if len(added):
+        rows, cols = np.concatenate((added, added[:, ::-1])).T
+        np.bitwise_or.at(bits, (rows, cols >> 6), mask(cols))
+    if len(removed):
+        rows, cols = np.concatenate((removed, removed[:, ::-1])).T
+        np.bitwise_and.at(bits, (rows, cols >> 6), ~mask(cols))
+
+
+def uncovered(nbr_bits, cover_bits, nodes, emitters):
+    """
+    批量评估：对 nodes 中的每个节点 i 和对应的发送方列表 emitters[k]，
+    返回 i 的邻居中不在任何发送方覆盖集合内的个数
+    """
+    nodes = np.asarray(nodes, dtype=np.int64)
+    counts = np.array([len(e) for e in emitters], dtype=np.int64)
+    covered = np.zeros((len(nodes), nbr_bits.shape[1]), dtype=np.uint64)
+    has = np.flatnonzero(counts)
+    if has.size:
+        flat = np.concatenate([np.asarray(emitters[k], dtype=np.int64) for k in has])
+        starts = np.cumsum(counts[has]) - counts[has]
+        covered[has] = np.bitwise_or.reduceat(cover_bits[flat], starts, axis=0)
+    return popcount(nbr_bits[nodes] & ~covered)
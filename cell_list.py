@@ -0,0 +1,131 @@
+# 移动节点的邻居维护（cell list）
+# 格子边长为 R，节点按所在格子的编号排序保存（skey 为排好序的格子编号，order 为对应的节点 id），
+# 与 neighbor_index.grid_pairs 相同，用 searchsorted 找出周围 3x3 个格子中的节点（同一列的 3 个格子编号相邻，每列查一个区间）。
+# 节点移动后：
+#   - 只有格子发生变化的节点才从排序数组中删除、再按新的格子编号插入
+#   - 只为移动的节点在移动前、后各查询一次距离 < R 的邻居对，两者相减得到新增和删除的邻居对（增量），
+#     调用方据此修补 nbrs、位图等，不再每个 slot 做 O(n^2) 的重建
+# 以上都是对移动节点的向量化运算，只有按增量修补邻居集合时逐对处理。
+# 对外接口与 NeighborIndex 相同（neighbors / degree / distance / edges_from / neighbor_sets），可以直接替换 Simu.nbr_index。
+# neighbor_sets 返回的是内部的集合本身，move 时原地修改，赋给 node.nbrs 后不需要另外更新。
+
+import numpy as np
+
+import neighbor_index
+from neighbor_index import expand
+
+# 格子编号 (cx + OFFSET) * WIDTH + (cy + OFFSET)，|cx|、|cy| < OFFSET
+OFFSET = 1 << 20
+WIDTH = 1 << 22
+
+
+class CellList:
+    def __init__(self, x, y, R):
+        """x, y 复制一份保存，move 时更新（移动前的位置用于求删除的邻居对）"""
+        self.x = np.array(x, dtype=float)
+        self.y = np.array(y, dtype=float)
+        self.R = R
+        self.n = len(self.x)
+
+        index = neighbor_index.NeighborIndex(self.x, self.y, R)
+        self.nbrs = index.neighbor_sets()
+        self.deg = index.degree()
+
+        self.key = self.cell_key(self.x, self.y)
+        self.order = np.argsort(self.key, kind='stable')
+        self.skey = self.key[self.order]
+
+    def cell_key(self, x, y):
+        cx = np.floor(x / self.R).astype(np.int64)
+        cy = np.floor(y / self.R).astype(np.int64)
+        return (cx + OFFSET) * WIDTH + (cy + OFFSET)
+
+    def neighbors(self, i):
+        return np.array(sorted(self.nbrs[i]), dtype=np.int64)
+
+    def degree(self):
+        """每个节点的邻居数，move 时原地更新"""
+        return self.deg
+
+    def num_edges(self):
+        return int(self.deg.sum()) // 2
+
+    def distance(self, i, j):
+        return np.sqrt((self.x[i] - self.x[j]) ** 2 + (self.y[i] - self.y[j]) ** 2)
+
+    def edges_from(self, senders):
+        """返回 senders 的所有 (发送方, 接收方) 对"""
+        senders = np.asarray(senders, dtype=np.int64)
+        dst = [self.neighbors(i) for i in senders.tolist()]
+        return np.repeat(senders, self.deg[senders]), np.concatenate(dst) if dst else np.zeros(0, dtype=np.int64)
+
+    def neighbor_sets(self):
+        return self.nbrs
+
+    def pairs(self, ids):
+        """ids（不重复）中的节点按当前位置的所有邻居对，编码为 i * n + j（i < j），不重复"""
+        # 按格子排序后查询，searchsorted 的访问更集中；同一列的 3 个格子编号相邻，每列只需一个区间
+        ids = ids[np.argsort(self.key[ids], kind='stable')]
+        key = self.key[ids]
+        src_all, dst_all = [], []
+        for dx in (-1, 0, 1):
+            lo = np.searchsorted(self.skey, key + dx * WIDTH - 1, side='left')
+            cnt = np.searchsorted(self.skey, key + dx * WIDTH + 1, side='right') - lo
+            src_all.append(np.repeat(ids, cnt))
+            dst_all.append(self.order[expand(lo, cnt)])
+        src, dst = np.concatenate(src_all), np.concatenate(dst_all)
+        # 两个端点都在 ids 中的对会从两边各找到一次，只保留 src < dst 的一次
+        moved = np.zeros(self.n, dtype=bool)
+        moved[ids] = True
+        keep = (src < dst) | ~moved[dst]
+        src, dst = src[keep], dst[keep]
+        keep = (np.sqrt((self.x[src] - self.x[dst]) ** 2 + (self.y[src] - self.y[dst]) ** 2) < self.R) & (src != dst)
+        src, dst = src[keep], dst[keep]
+        return np.minimum(src, dst) * self.n + np.maximum(src, dst)
+
+    def rebin(self, ids):
+        """ids 的位置已更新，格子变化的节点从排序数组中删除后按新的格子编号插入"""
+        key = self.cell_key(self.x[ids], self.y[ids])
+        changed = np.flatnonzero(key != self.key[ids])
+        if changed.size == 0:
+            return
+        moved, new = ids[changed], key[changed]
+        # 旧格子编号的区间中找到这些节点的位置
+        lo = np.searchsorted(self.skey, self.key[moved], side='left')
+        cnt = np.searchsorted(self.skey, self.key[moved], side='right') - lo
+        pos = expand(lo, cnt)
+        pos = pos[self.order[pos] == np.repeat(moved, cnt)]
+        keep = np.ones(self.n, dtype=bool)
+        keep[pos] = False
+        order, skey = self.order[keep], self.skey[keep]
+        s = np.argsort(new, kind='stable')
+        at = np.searchsorted(skey, new[s])
+        self.order = np.insert(order, at, moved[s])
+        self.skey = np.insert(skey, at, new[s])
+        self.key[moved] = new
+
+    def move(self, ids, x, y):
+        """
+        节点 ids（不重复）移动到 (x, y)，返回 (added, removed)：新增和删除的邻居对，形状为 (k, 2)，每行 i < j
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        before = self.pairs(ids)
+        self.x[ids] = x
+        self.y[ids] = y
+        self.rebin(ids)
+        after = self.pairs(ids)
+
+        n = self.n
+        added = np.sort(np.setdiff1d(after, before, assume_unique=True))
+        removed = np.sort(np.setdiff1d(before, after, assume_unique=True))
+        added = np.column_stack((added // n, added % n))
+        removed = np.column_stack((removed // n, removed % n))
+        for i, j in added.tolist():
+            self.nbrs[i].add(j)
+            self.nbrs[j].add(i)
+        for i, j in removed.tolist():
+            self.nbrs[i].discard(j)
+            self.nbrs[j].discard(i)
+        np.add.at(self.deg, added.ravel(), 1)
+        np.subtract.at(self.deg, removed.ravel(), 1)
+        return added, removed
@@ -0,0 +1,88 @@
+# 结构化事件记录，替代节点处理中的 print
+# 每条记录是定长的 (slot, node, event, peer, value)，按列写入预先分配的环形缓冲区，满了之后覆盖最早的记录，
+# 可以导出为二进制的列式文件（.npz）。
+# 调用处先检查级别再记录：
+#     if tracer.level >= event_trace.INFO:
+#         tracer.emit(slot, node_id, event_trace.RECV, peer)
+# 关闭时（level = OFF）每个调用点只多一次属性读取。
+
+import numpy as np
+
+# 级别
+OFF, INFO, DEBUG = 0, 1, 2
+
+# 事件
+# peer 只保存节点或消息 id（没有时为 -1），value 保存事件附带的数值（没有时为 0）：
+#   RECV     peer: 消息的发送方 id
+#   SEND     value: 发出消息的 ttl（有 ttl 的协议）
+#   SKIP     B 节点本 slot 不转发
+#   TIMEOUT  I 节点定时器到期
+#   DROP     peer: 被丢弃的（本 slot 收到的）消息的发送方 id
+#   DELIVER  peer: 接收方 id
+#   TIMER    value: 节点的定时器（到期 slot）
+RECV, SEND, SKIP, TIMEOUT, DROP, DELIVER, TIMER = range(7)
+EVENTS = ['recv', 'send', 'skip', 'timeout', 'drop', 'deliver', 'timer']
+
+# 缓冲区默认大小（记录条数）
+CAPACITY = 1 << 20
+
+
+class Tracer:
+    def __init__(self, level=OFF, capacity=CAPACITY):
+        self.level = level
+        self.capacity = capacity
+        self.slot = np.zeros(capacity, dtype=np.int32)
+        self.node = np.zeros(capacity, dtype=np.int32)
+        self.event = np.zeros(capacity, dtype=np.int8)
+        self.peer = np.zeros(capacity, dtype=np.int32)
+        self.value = np.zeros(capacity, dtype=np.int32)
+        self.total = 0  # 写入过的记录总数，超过 capacity 时较早的记录已被覆盖
+
+    def emit(self, slot, node, event, peer=-1, value=0):
+        i = self.total % self.capacity
+        self.slot[i] = slot
+        self.node[i] = node
+        self.event[i] = event
+        self.peer[i] = peer
+        self.value[i] = value
+        self.total += 1
+
+    def emit_many(self, slot, nodes, event, peers=-1, values=0):
+        """一次记录多条同一 slot、同一事件的记录（向量化引擎使用）"""
+        nodes = np.asarray(nodes)
+        k = len(nodes)
+        if k == 0:
+            return
+        if k > self.capacity:
+            nodes = nodes[-self.capacity:]
+            peers = np.broadcast_to(peers, (k,))[-self.capacity:]
+            values = np.broadcast_to(values, (k,))[-self.capacity:]
+            self.total += k - self.capacity
+            k = self.capacity
+        idx = (self.total + np.arange(k)) % self.capacity
+        self.slot[idx] = slot
+        self.node[idx] = nodes
+        self.event[idx] = event
+        self.peer[idx] = peers
+        self.value[idx] = values
+        self.total += k
+
+    def records(self):
+        """缓冲区中的记录，按写入顺序，返回 dict: 列名 -> 数组"""
+        if self.total <= self.capacity:
+            order = np.arange(self.total)
+        else:
+            order = (self.total + np.arange(self.capacity)) % self.capacity
+        return {'slot': self.slot[order], 'node': self.node[order], 'event': self.event[order], 'peer': self.peer[order],
+                'value': self.value[order]}
+
+    def dump(self, path):
+        np.savez(path, events=np.array(EVENTS), dropped=max(0, self.total - self.capacity), **self.records())
+
+    def clear(self):
+        self.total = 0
+
+
+def load(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
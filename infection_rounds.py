@@ -0,0 +1,78 @@
+# PPP 静态感染的按轮推进
+# 每轮中，本轮新感染节点（frontier）把距离 <= R 的易感节点全部感染，这些节点组成下一轮的 frontier。
+# 原来的 infect_nodes 对 frontier 中每个节点遍历所有点，逐对创建数组并调用 np.linalg.norm；
+# 这里用 KD-tree 一次得到所有距离 <= R 的节点对，保存为 CSR（neighbor_index.NeighborIndex，inclusive=True，每个节点的邻居按 id 升序）；
+# 每轮把整个 frontier 在 CSR 上一次展开为 (感染者, 被感染者) 对，再用状态数组一次过滤掉已感染节点。
+# 每轮对 frontier 调用 query_ball_point 的代价（约 1ms / 轮，1000 个点）主要在 KD-tree 查询本身，只查询一次后每轮为几十微秒。
+# 结果与原来的双重循环相同，包括每个新感染节点的感染者（按 frontier 的遍历顺序，第一个在范围内的节点）
+# 和新感染节点被发现的顺序（用它构建的 set 的遍历顺序，也就是下一轮 frontier 的顺序，与原来一致）。
+# 感染概率为 1 时结果只由距离 <= R 的图决定：最终感染集合是 source 所在的连通分量，总轮数是 source 的 BFS 离心率，
+# final_state 在 CSR 上做一次 BFS 直接得到，不再逐轮推进；sweep 对一组 lambda0 各生成一个 PPP 得到这些量（渗流研究）。
+
+import numpy as np
+
+import neighbor_index
+from neighbor_index import expand
+
+
+class InfectionRounds:
+    def __init__(self, xx, yy, R):
+        self.index = neighbor_index.NeighborIndex(xx, yy, R, method='kdtree', inclusive=True)
+        self.xx, self.yy = self.index.x, self.index.y
+        self.R = R
+        self.n = self.index.n
+        self.ptr, self.idx = self.index.ptr, self.index.idx
+
+    def step(self, frontier, node_states):
+        """
+        frontier: 本轮的感染节点（任意可迭代对象，顺序即原来循环的顺序）
+        node_states: 0 为易感、1 为感染，新感染节点原地置为 1
+        返回 (new, parents)：新感染节点（按原来循环中被发现的顺序）和各自的感染者
+        """
+        frontier = np.fromiter(frontier, dtype=np.int64)
+        if frontier.size == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        # 按 frontier 顺序、每个节点的邻居按 id 升序展开，即原来双重循环检查的顺序
+        deg = self.ptr[frontier + 1] - self.ptr[frontier]
+        src = np.repeat(frontier, deg)
+        dst = self.idx[expand(self.ptr[frontier], deg)]
+        keep = node_states[dst] == 0
+        src, dst = src[keep], dst[keep]
+        # 每个节点第一次出现的位置即按 frontier 顺序的第一个感染者，位置的先后即发现的顺序
+        first = np.full(self.n, dst.size)
+        np.minimum.at(first, dst, np.arange(dst.size))
+        first = np.sort(first[first < dst.size])
+        new = dst[first]
+        node_states[new] = 1
+        return new, src[first]
+
+    def final_state(self, source):
+        """
+        感染结束时的状态，返回 (hops, rounds)：hops 为每个节点被感染的轮次（source 为 0，不可达为 -1），
+        rounds 为总感染轮数（有新感染的轮数，即 hops 的最大值）
+        """
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import shortest_path
+
+        graph = csr_matrix((np.ones(len(self.idx)), self.idx, self.ptr), shape=(self.n, self.n))
+        dist = shortest_path(graph, method='D', unweighted=True, indices=source)
+        hops = np.where(np.isinf(dist), -1, dist).astype(np.int64)
+        return hops, int(hops.max())
+
+
+def sweep(lambda_values, width, height, R, rng, source=0):
+    """
+    对每个强度 lambda0 在 width x height 的区域内生成一个 PPP，由 final_state 得到结果，
+    每个 lambda0 一行：(lambda0, 节点数, 最终感染率, 总感染轮数)
+    """
+    rows = []
+    for lambda0 in lambda_values:
+        num = rng.poisson(lambda0 * width * height)
+        if num <= source:
+            rows.append((lambda0, num, 0.0, 0))
+            continue
+        xx = rng.uniform(0, width, num)
+        yy = rng.uniform(0, height, num)
+        hops, rounds = InfectionRounds(xx, yy, R).final_state(source)
+        rows.append((lambda0, num, float(np.count_nonzero(hops >= 0) / num), rounds))
+    return rows
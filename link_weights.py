@@ -0,0 +1,48 @@
+# 按需生成的链路权重
+# 权重只对距离 < R 的节点对（neighbor_index 中的边）存在，由 (seed, i, j) 经整数哈希（splitmix64）确定性地得到，
+# 需要时重新计算而不是保存 n*n 的随机矩阵；以 float32 CSR 的形式交给稀疏 Prim。
+# symmetric 为 True 时 w(i, j) = w(j, i)。
+
+import numpy as np
+
+GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def mix(z):
+    """splitmix64 的输出函数，z 为 uint64 数组（乘法按 2^64 取模）"""
+    z = (z ^ (z >> np.uint64(30))) * MIX1
+    z = (z ^ (z >> np.uint64(27))) * MIX2
+    return z ^ (z >> np.uint64(31))
+
+
+def uniform(seed, i, j):
+    """(seed, i, j) 对应的 (0, 1] 上的均匀随机数，i、j 可以是数组"""
+    i = np.atleast_1d(np.asarray(i)).astype(np.uint64)
+    j = np.atleast_1d(np.asarray(j)).astype(np.uint64)
+    z = mix(np.full(i.shape, seed, dtype=np.uint64) * GOLDEN + i)
+    z = mix(z ^ (j * GOLDEN + MIX1))
+    return ((z >> np.uint64(11)) + np.uint64(1)) * 2.0 ** -53
+
+
+class LinkWeights:
+    def __init__(self, index, seed, symmetric=False):
+        """index: NeighborIndex，只为其中的边生成权重"""
+        self.index = index
+        self.seed = seed
+        self.symmetric = symmetric
+
+    def weight(self, i, j):
+        """边 (i, j) 的权重（float32），可以是数组"""
+        if self.symmetric:
+            i, j = np.minimum(i, j), np.maximum(i, j)
+        return uniform(self.seed, i, j).astype(np.float32)
+
+    def csr(self):
+        """所有边的权重，float32 CSR 矩阵（scipy.sparse），供 Prim.prim_sparse 使用"""
+        from scipy.sparse import csr_matrix
+
+        index = self.index
+        rows = np.repeat(np.arange(index.n), index.degree())
+        return csr_matrix((self.weight(rows, index.idx), index.idx, index.ptr), shape=(index.n, index.n))
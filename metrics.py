@@ -0,0 +1,86 @@
+# 增量统计
+# 取代 Stats.update 中遍历所有节点求 msg_num 之和的做法：转发、接收在发生时计数（每个事件 O(1)），
+# 每个 slot 结束时把覆盖节点数、本 slot 的转发数和接收数写入预先分配的数组（满了之后容量翻倍），
+# 得到整个运行过程的 AMR / 覆盖率随时间的曲线，而不只是最后的数值。可以导出为 .npz。
+# 用法（flooding.py、prim_simu.py 中的 Stats 继承 Metrics）：
+#     simu.stats.forward()              节点转发一次
+#     simu.stats.receive(k)             节点处理 inbox 时收到 k 条消息
+#     simu.stats.end_slot(covered)      slot 结束，covered 为已收到消息的节点数
+
+import numpy as np
+
+# 时间序列的初始容量（slot 数）
+CAPACITY = 256
+
+
+class Metrics:
+    def __init__(self, n, T_p, T_tx, capacity=CAPACITY):
+        """
+        n: 节点数
+        T_p, T_tx: 计算 T_d 用，T_d = (slot - 1) * T_p + slot * T_tx，T_tx 为一次发送的时间（T_difs + T_backoff + T_D）
+        """
+        self.n = n
+        self.T_p = T_p
+        self.T_tx = T_tx
+        self.N_f = 0
+        self.msgs = 0
+        self.slot = 0
+        self.amr = 0
+        self.srb = 0
+        self.rdn = 0
+        self.T_d = 0
+
+        # 本 slot 的计数，end_slot 时写入时间序列
+        self.slot_forwards = 0
+        self.slot_receptions = 0
+        self.coverage = np.zeros(capacity, dtype=np.int64)
+        self.forwards = np.zeros(capacity, dtype=np.int64)
+        self.receptions = np.zeros(capacity, dtype=np.int64)
+
+    def forward(self):
+        self.N_f += 1
+        self.slot_forwards += 1
+
+    def receive(self, k):
+        self.msgs += k
+        self.slot_receptions += k
+
+    def end_slot(self, covered):
+        if self.slot == len(self.coverage):
+            for name in ('coverage', 'forwards', 'receptions'):
+                arr = getattr(self, name)
+                setattr(self, name, np.concatenate((arr, np.zeros_like(arr))))
+        self.coverage[self.slot] = covered
+        self.forwards[self.slot] = self.slot_forwards
+        self.receptions[self.slot] = self.slot_receptions
+        self.slot_forwards = 0
+        self.slot_receptions = 0
+        self.slot += 1
+
+    def delay(self, slot):
+        return (slot - 1) * self.T_p + slot * self.T_tx
+
+    def update(self):
+        """按当前计数更新 N_f 之外的指标，与原来的 Stats.update 相同"""
+        n = self.n
+        self.srb = (n - self.N_f) / n
+        self.rdn = self.N_f / n
+        # amr是所有node的msg_num的平均值
+        self.amr = self.msgs / n
+        self.T_d = self.delay(self.slot)
+
+    def series(self):
+        """每个 slot 一行的时间序列，返回 dict: 列名 -> 数组"""
+        k = self.slot
+        slot = np.arange(1, k + 1)
+        return {
+            'slot': slot,
+            'coverage': self.coverage[:k] / self.n,
+            'forwards': self.forwards[:k],
+            'receptions': self.receptions[:k],
+            'amr': np.cumsum(self.receptions[:k]) / self.n,
+            'T_d': self.delay(slot),
+        }
+
+    def dump(self, path):
+        np.savez(path, **self.series())
@@ -0,0 +1,128 @@
+# 空间邻居索引
+# 用均匀网格（或 KD-tree）找出所有距离 < R 的节点对，以 CSR 形式保存：
+#   idx[ptr[i]:ptr[i + 1]] 为节点 i 的邻居（不含自身，按 id 升序）
+# 构建为 O(n log n)，内存为 O(n + 边数)，替代各 Simu.init_distance 中的 n*n distance 矩阵。
+# 距离的计算方式与 init_distance 相同：np.sqrt((x_i - x_j) ** 2 + (y_i - y_j) ** 2)
+# inclusive 为 True 时改为距离 <= R（PPP 脚本中的感染/载波范围用 <= R）
+
+import numpy as np
+
+# 每批处理的节点数，限制候选对数组的大小
+BATCH = 4096
+
+
+def expand(starts, counts):
+    """把若干区间 [start, start + count) 展开成一个下标数组"""
+    total = counts.sum()
+    offset = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offset
+
+
+def within(dist, R, inclusive):
+    return dist <= R if inclusive else dist < R
+
+
+def grid_pairs(x, y, R, inclusive=False):
+    """网格分桶：格子边长为 R，每个节点只与周围 3x3 个格子中的节点计算距离（距离 <= R 的节点对也在其中）"""
+    n = len(x)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    cx = np.floor(x / R).astype(np.int64)
+    cy = np.floor(y / R).astype(np.int64)
+    cx -= cx.min()
+    cy -= cy.min()
+    ny = cy.max() + 3
+    key = (cx + 1) * ny + (cy + 1)
+    order = np.argsort(key, kind='stable')
+    skey = key[order]
+
+    src_all, dst_all = [], []
+    for start in range(0, n, BATCH):
+        pts = np.arange(start, min(start + BATCH, n))
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                k = key[pts] + dx * ny + dy
+                lo = np.searchsorted(skey, k, side='left')
+                hi = np.searchsorted(skey, k, side='right')
+                cnt = hi - lo
+                src = np.repeat(pts, cnt)
+                dst = order[expand(lo, cnt)]
+                dist = np.sqrt((x[src] - x[dst]) ** 2 + (y[src] - y[dst]) ** 2)
+                keep = within(dist, R, inclusive) & (src != dst)
+                src_all.append(src[keep])
+                dst_all.append(dst[keep])
+    return np.concatenate(src_all), np.concatenate(dst_all)
+
+
+def kdtree_pairs(x, y, R, inclusive=False):
+    """
+    scipy 的 cKDTree，query_pairs 返回距离 <= R 的对，再按与上面相同的距离公式过滤；
+    半径略微放大，避免 KD-tree 在边界上的舍入差异漏掉距离恰好为 R 的对
+    """
+    from scipy.spatial import cKDTree
+
+    pairs = cKDTree(np.column_stack((x, y))).query_pairs(R * (1 + 1e-9), output_type='ndarray')
+    i, j = pairs[:, 0], pairs[:, 1]
+    keep = within(np.sqrt((x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2), R, inclusive)
+    i, j = i[keep], j[keep]
+    return np.concatenate((i, j)), np.concatenate((j, i))
+
+
+class NeighborIndex:
+    def __init__(self, x, y, R, method='grid', inclusive=False):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.R = R
+        self.n = len(self.x)
+
+        if method == 'grid':
+            src, dst = grid_pairs(self.x, self.y, R, inclusive)
+        elif method == 'kdtree':
+            src, dst = kdtree_pairs(self.x, self.y, R, inclusive)
+        else:
+            raise ValueError(f"unknown method {method}")
+
+        order = np.lexsort((dst, src))
+        self.idx = dst[order]
+        self.ptr = np.zeros(self.n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=self.n), out=self.ptr[1:])
+
+    def neighbors(self, i):
+        return self.idx[self.ptr[i]:self.ptr[i + 1]]
+
+    def degree(self):
+        return np.diff(self.ptr)
+
+    def num_edges(self):
+        """无向边数"""
+        return len(self.idx) // 2
+
+    def distance(self, i, j):
+        return np.sqrt((self.x[i] - self.x[j]) ** 2 + (self.y[i] - self.y[j]) ** 2)
+
+    def edges_from(self, senders):
+        """返回 senders 的所有 (发送方, 接收方) 对"""
+        senders = np.asarray(senders, dtype=np.int64)
+        deg = self.ptr[senders + 1] - self.ptr[senders]
+        return np.repeat(senders, deg), self.idx[expand(self.ptr[senders], deg)]
+
+    def neighbor_sets(self):
+        """每个节点的邻居集合，对应各 Simu 中的 node.nbrs"""
+        return [set(self.neighbors(i).tolist()) for i in range(self.n)]
+
+
+def stack(indices):
+    """
+    把 K 个副本的邻居索引拼成一个块对角的索引：第 r 个副本的节点 i 编号为 r * n + i，
+    副本之间没有边，对拼接后的数组做一次向量化运算就同时推进了所有副本
+    """
+    n = indices[0].n
+    stacked = NeighborIndex.__new__(NeighborIndex)
+    stacked.x = np.concatenate([index.x for index in indices])
+    stacked.y = np.concatenate([index.y for index in indices])
+    stacked.R = indices[0].R
+    stacked.n = n * len(indices)
+    stacked.idx = np.concatenate([index.idx + r * n for r, index in enumerate(indices)])
+    ptr_offset = np.cumsum([0] + [len(index.idx) for index in indices[:-1]])
+    stacked.ptr = np.concatenate([[0]] + [index.ptr[1:] + off for index, off in zip(indices, ptr_offset)])
+    return stacked
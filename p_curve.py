@@ -0,0 +1,103 @@
+# 单次计算所有转发概率 p 的结果（monotone coupling）
+# 每个节点只抽一个均匀阈值 u_i，"以概率 p 转发" 改为 "u_i <= p 时转发"，于是转发节点集合随 p 单调增大，
+# 同一拓扑、同一组阈值下所有 p 的结果可以一起算出，曲线不再混入每个 p 重新抽取 PPP 和随机数带来的方差。
+#   one_shot: 每个被感染节点只有一次转发机会（ppp_broadcast_with_probability.simulate）
+#     按阈值从小到大扫描（瓶颈路径），得到每个节点成为转发节点的最小 p，覆盖率和 flows 对所有 p 一次得到，
+#     rounds 对每个 p 在 CSR 上做一次分层 BFS
+#   retry_slots: B 节点每个 slot 以概率 p 尝试直到发送（flooding.py）
+#     尝试次数为几何分布，用同一个 u_i 取逆 CDF，每个 p 做一次以节点尝试次数为权的最短路
+
+import heapq
+import numpy as np
+
+
+def forward_thresholds(index, source, u):
+    """
+    每个节点成为转发节点的最小 p：tau_j = 从 source 到 j 的所有路径上 max(u) 的最小值（source 自身不计，tau = 0），
+    到不了的节点为 inf。按阈值从小到大扩展（与按 u 排序逐个加入节点、用并查集合并的结果相同）
+    """
+    tau = np.full(index.n, np.inf)
+    tau[source] = 0.0
+    heap = [(0.0, source)]
+    done = np.zeros(index.n, dtype=bool)
+    while heap:
+        level, i = heapq.heappop(heap)
+        if done[i]:
+            continue
+        done[i] = True
+        for j in index.neighbors(i).tolist():
+            t = max(level, u[j])
+            if t < tau[j]:
+                tau[j] = t
+                heapq.heappush(heap, (t, j))
+    return tau
+
+
+def infection_thresholds(index, source, tau):
+    """每个节点被感染的最小 p：邻居中最小的 tau（source 为 0）"""
+    src, dst = index.edges_from(np.arange(index.n))
+    iota = np.full(index.n, np.inf)
+    np.minimum.at(iota, dst, tau[src])
+    iota[source] = 0.0
+    return iota
+
+
+def rounds(index, source, forward):
+    """forward 为转发节点的掩码时，感染在第几轮结束（有新感染的轮数）"""
+    depth = np.full(index.n, -1, dtype=np.int64)
+    depth[source] = 0
+    frontier = np.array([source])
+    r = 0
+    while frontier.size:
+        _, dst = index.edges_from(frontier[forward[frontier]])
+        new = np.unique(dst[depth[dst] < 0])
+        if new.size:
+            depth[new] = r + 1
+            r += 1
+        frontier = new
+    return r
+
+
+def one_shot(index, source, u, p_values):
+    """
+    每个节点只有一次转发机会（source 必定转发）时，对 p_values 中的每个 p 返回
+    infection_rate、flows（每次转发计入通信半径内的所有节点，包括自身）和 rounds 的数组
+    """
+    tau = forward_thresholds(index, source, u)
+    iota = infection_thresholds(index, source, tau)
+    cost = (index.degree() + 1)[np.argsort(tau, kind='stable')]
+    flows_cum = np.concatenate(([0], np.cumsum(cost)))
+    tau_sorted, iota_sorted = np.sort(tau), np.sort(iota)
+
+    p_values = np.asarray(p_values, dtype=float)
+    return {
+        'infection_rate': np.searchsorted(iota_sorted, p_values, side='right') / index.n,
+        'flows': flows_cum[np.searchsorted(tau_sorted, p_values, side='right')],
+        'rounds': np.array([rounds(index, source, tau <= p) for p in p_values]),
+    }
+
+
+def attempts(u, p):
+    """以概率 p 重复尝试时第几次成功：几何分布的逆 CDF，对同一个 u 随 p 单调不增"""
+    if p >= 1:
+        return np.ones(len(u), dtype=np.int64)
+    return np.maximum(1, np.ceil(np.log1p(-u) / np.log1p(-p))).astype(np.int64)
+
+
+def retry_slots(index, source, u, p):
+    """
+    B 节点每个 slot 以概率 p 尝试直到发送（source 第一个 slot 必定发送）时每个节点发送的 slot，到不了的为 -1。
+    节点 j 在 slot T_j 成为 B，在 T_j + k_j - 1 发送，邻居在下一个 slot 成为 B：T_i = min_j (T_j + k_j)
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+
+    k = attempts(u, p)
+    k[source] = 1
+    n = index.n
+    graph = csr_matrix((k[np.repeat(np.arange(n), index.degree())].astype(float), index.idx, index.ptr), shape=(n, n))
+    start = dijkstra(graph, indices=source)
+    send = np.full(n, -1, dtype=np.int64)
+    reached = np.isfinite(start)
+    send[reached] = start[reached].astype(np.int64) + k[reached] - 1
+    return send
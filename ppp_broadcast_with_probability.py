@@ -2,6 +2,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import random
 import time
+import neighbor_index
+import p_curve
 
 # 固定随机种子以便结果可复现
 # random.seed(42)
@@ -21,6 +23,9 @@ p_values = np.arange(0.1, 1.05, 0.05)
 efficiency_indices = []  # 存储每个p下的归一化效率指标
 valid_p_values = []  # 存储感染率达到100%的p值
 
+# True 时只生成一个 PPP，每个节点抽一个均匀阈值 u（u <= p 时转发），一次得到所有 p 的结果（见 p_curve.py）
+single_pass = False
+
 # 模拟函数
 def simulate(p):
     numbPoints = np.random.poisson(lambda0 * areaTotal)
@@ -54,9 +59,21 @@ def simulate(p):
     infection_rate = np.mean(node_states)
     return flows, rounds, infection_rate
 
-# 对每个p值进行模拟并记录结果
-for p in p_values:
-    flows, rounds, infection_rate = simulate(p)
+# 同一个 PPP、同一组阈值下所有 p 的 (flows, rounds, infection_rate)
+def simulate_curve(p_values):
+    numbPoints = np.random.poisson(lambda0 * areaTotal)
+    xx = np.random.uniform(xMin, xMax, numbPoints)
+    yy = np.random.uniform(yMin, yMax, numbPoints)
+    initial_infection_index = random.randint(0, numbPoints - 1)
+    u = np.random.rand(numbPoints)
+    # 与 simulate 相同，距离 <= R_cs 的节点都在范围内
+    index = neighbor_index.NeighborIndex(xx, yy, R_cs, inclusive=True)
+    curve = p_curve.one_shot(index, initial_infection_index, u, p_values)
+    return list(zip(curve['flows'], curve['rounds'], curve['infection_rate']))
+
+# 对每个p值进行模拟并记录结果（每个 p 只有一次实现；多次实现、并行运行和置信区间见 ppp_sweep.py）
+results = simulate_curve(p_values) if single_pass else [simulate(p) for p in p_values]
+for p, (flows, rounds, infection_rate) in zip(p_values, results):
     if infection_rate == 1.0:  # 只有当感染率为100%时
         valid_p_values.append(p)
         efficiency_indices.append((flows, rounds))
@@ -55,7 +55,7 @@ def simulate(p):
 
     return flows, rounds
 
-# 对每个p值进行模拟并记录结果
+# 对每个p值进行模拟并记录结果（每个 p 只有一次实现；多次实现、并行运行和置信区间见 ppp_sweep.py）
 for p in p_values:
     flows, rounds = simulate(p)
     flows_per_p.append(flows)
@@ -2,6 +2,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import random
 import time
+import infection_rounds
 
 # 定义红色开始和结束的 ANSI 转义序列
 RED_START = "\033[91m"
@@ -77,18 +78,20 @@ R_cs = 1000  # 载波距离
 
 rounds = 0  # 记录感染过程进行的轮数
 
+# 距离 <= R 的邻居（CSR）只建一次
+kernel = infection_rounds.InfectionRounds(xx, yy, R_cs)
+
 def infect_nodes(current_round):
     global rounds, node_states, infected_by_round
     new_infections = set()
     if current_round in infected_by_round:
-        for i in infected_by_round[current_round]:
-            for j in range(numbPoints):
-                if node_states[j] == 0 and np.linalg.norm(np.array([xx[i], yy[i]]) - np.array([xx[j], yy[j]])) <= R_cs:
-                    node_states[j] = 1  # 感染易感节点
-                    new_infections.add(j)
-                    # 绘制感染路径
-                    ax.annotate("", xy=(xx[j], yy[j]), xytext=(xx[i], yy[i]),
-                                arrowprops=dict(arrowstyle="->", color="gray"))
+        # 整个 frontier 在预先建好的邻居 CSR 上一次展开（见 infection_rounds.py），parents 为各节点的感染者
+        new, parents = kernel.step(infected_by_round[current_round], node_states)
+        new_infections = set(new.tolist())
+        for i, j in zip(parents.tolist(), new.tolist()):
+            # 绘制感染路径
+            ax.annotate("", xy=(xx[j], yy[j]), xytext=(xx[i], yy[i]),
+                        arrowprops=dict(arrowstyle="->", color="gray"))
     if new_infections:
         rounds += 1
         infected_by_round[rounds] = new_infections
@@ -2,6 +2,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import random
 import time
+import infection_rounds
 
 # 定义红色开始和结束的 ANSI 转义序列
 RED_START = "\033[91m"
@@ -47,15 +48,16 @@ scatter = ax.scatter(xx, yy, c=colors, edgecolors='k')
 rounds = 0  # 记录感染过程进行的轮数
 is_infection_ended = False  # 标记感染过程是否已结束
 
+# 距离 <= R 的邻居（CSR）只建一次
+kernel = infection_rounds.InfectionRounds(xx, yy, R_cs)
+
 def infect_nodes(current_round):
     global node_states, infected_by_round
     new_infections = set()
     if current_round in infected_by_round:
-        for i in infected_by_round[current_round]:
-            for j in range(numbPoints):
-                if node_states[j] == 0 and np.linalg.norm(np.array([xx[i], yy[i]]) - np.array([xx[j], yy[j]])) <= R_cs:
-                    node_states[j] = 1  # 感染易感节点
-                    new_infections.add(j)
+        # 整个 frontier 在预先建好的邻居 CSR 上一次展开（见 infection_rounds.py）
+        new, _ = kernel.step(infected_by_round[current_round], node_states)
+        new_infections = set(new.tolist())
     if new_infections:
         infected_by_round[current_round + 1] = new_infections
     return len(new_infections) > 0
@@ -3,6 +3,7 @@ import matplotlib.pyplot as plt
 from matplotlib.backend_bases import MouseEvent
 import random
 import time
+import infection_rounds
 
 # 定义红色开始和结束的 ANSI 转义序列
 RED_START = "\033[91m"
@@ -19,6 +20,10 @@ areaTotal = (xMax - xMin) * (yMax - yMin)
 # 定义感染半径
 R_inf = 800
 
+# True 时不逐轮推进：最终感染集合为初始节点所在的连通分量，总轮数为其 BFS 离心率，
+# 一次 BFS 直接得到（见 infection_rounds.InfectionRounds.final_state），适用于大规模的 lambda0 扫描
+CLOSED_FORM = False
+
 # 泊松点过程参数
 lambda0 = 0.00000256  # 强度参数调整为每单位面积的平均点数
 numbPoints = np.random.poisson(lambda0 * areaTotal)
@@ -43,26 +48,35 @@ max_infection_rate = 0  # 最大感染率
 max_infection_round = 0  # 达到最大感染率的轮数
 start_time = time.time() * 1000  # 开始时间，转换为毫秒
 
+# 距离 <= R 的邻居（CSR）只建一次
+kernel = infection_rounds.InfectionRounds(xx, yy, R_inf)
+
 def infect_nodes(current_round):
     global node_states, infected_by_round
     new_infections = set()
     if current_round in infected_by_round:
-        for i in infected_by_round[current_round]:
-            for j in range(numbPoints):
-                if node_states[j] == 0 and np.linalg.norm(np.array([xx[i], yy[i]]) - np.array([xx[j], yy[j]])) <= R_inf:
-                    node_states[j] = 1  # 感染易感节点
-                    new_infections.add(j)
+        # 整个 frontier 在预先建好的邻居 CSR 上一次展开（见 infection_rounds.py）
+        new, _ = kernel.step(infected_by_round[current_round], node_states)
+        new_infections = set(new.tolist())
     if new_infections:
         infected_by_round[current_round + 1] = new_infections
     return len(new_infections) > 0
 
-# 自动进行感染过程，直到没有新的感染发生
-while infect_nodes(rounds):
-    rounds += 1  # 每轮感染结束，轮数加一
-    current_infection_rate = np.sum(node_states) / numbPoints
-    if current_infection_rate > max_infection_rate:
-        max_infection_rate = current_infection_rate
+if CLOSED_FORM:
+    hops, rounds = kernel.final_state(initial_infection_index)
+    node_states[hops >= 0] = 1
+    # 每轮都有新的感染，感染率在最后一轮达到最大
+    if rounds > 0:
+        max_infection_rate = np.sum(node_states) / numbPoints
         max_infection_round = rounds
+else:
+    # 自动进行感染过程，直到没有新的感染发生
+    while infect_nodes(rounds):
+        rounds += 1  # 每轮感染结束，轮数加一
+        current_infection_rate = np.sum(node_states) / numbPoints
+        if current_infection_rate > max_infection_rate:
+            max_infection_rate = current_infection_rate
+            max_infection_round = rounds
 
 # 感染过程结束，统计结果
 end_time = time.time() * 1000  # 结束时间，转换为毫秒
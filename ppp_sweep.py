@@ -0,0 +1,116 @@
+# ppp_broadcast_with_probability.py / ppp_broadcast_with_range.py 的多次实现批量运行
+# 两个脚本对每个 p 只生成一个 PPP、运行一次，曲线是单个样本。这里对每个 p 在进程池上运行 realizations 次独立实现，
+# 每次实现有自己的随机数流（SeedSequence 逐个派生，结果与任务的划分和进程数无关，可复现），
+# 每次运行的记录写入 runs CSV（边算边写），每个 p 的 flows / rounds / 感染率的均值和 95% 置信区间
+# 以及感染率达到 100% 的比例写入汇总 CSV。
+# 单次实现与两个脚本中的 simulate(p) 相同：第 0 轮的节点必定转发，之后每个新感染节点以概率 p 转发一次，
+# 转发节点距离 <= R_cs 的所有节点（包括自身）各计一次 flow；邻居由 infection_rounds.InfectionRounds 一次建好。
+
+import csv
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+import infection_rounds
+
+# Parameters（与两个脚本保持一致）
+xMin, xMax, yMin, yMax = 0, 5000, 0, 5000
+lambda0 = 0.00001
+areaTotal = (xMax - xMin) * (yMax - yMin)
+R_cs = 1000
+p_values = np.arange(0.1, 1.05, 0.05)
+realizations = 200
+chunk = 20  # 每个任务运行的实现数
+base_seed = 2024
+workers = os.cpu_count()
+res_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'res')
+runs_path = os.path.join(res_dir, 'ppp_sweep_runs.csv')
+out_path = os.path.join(res_dir, 'ppp_sweep.csv')
+
+RUN_FIELDS = ['p', 'realization', 'numbPoints', 'flows', 'rounds', 'infection_rate']
+FIELDS = ['p', 'realizations', 'complete', 'complete_rate',
+          'flows_mean', 'flows_ci95_low', 'flows_ci95_high',
+          'rounds_mean', 'rounds_ci95_low', 'rounds_ci95_high',
+          'infection_rate_mean', 'infection_rate_ci95_low', 'infection_rate_ci95_high', 'elapsed']
+
+
+def simulate(p, rng):
+    """一次实现，返回 (numbPoints, flows, rounds, infection_rate)"""
+    numbPoints = rng.poisson(lambda0 * areaTotal)
+    if numbPoints == 0:
+        return 0, 0, 0, 0.0
+    xx = rng.uniform(xMin, xMax, numbPoints)
+    yy = rng.uniform(yMin, yMax, numbPoints)
+    kernel = infection_rounds.InfectionRounds(xx, yy, R_cs)
+    node_states = np.zeros(numbPoints, dtype=int)
+    frontier = np.array([rng.integers(numbPoints)])
+    node_states[frontier] = 1
+    flows = 0
+    rounds = 0
+    while True:
+        infection_chance = 1 if rounds == 0 else p  # 第一轮感染不受概率 p 影响
+        senders = frontier[rng.random(frontier.size) <= infection_chance]
+        # 距离 <= R_cs 的邻居加上自身
+        flows += int((kernel.ptr[senders + 1] - kernel.ptr[senders]).sum()) + senders.size
+        frontier, _ = kernel.step(senders, node_states)
+        if frontier.size == 0:
+            break
+        rounds += 1
+    return numbPoints, flows, rounds, float(np.mean(node_states))
+
+
+def run_chunk(p, seqs, first):
+    """运行一组实现，seqs 为各实现的 SeedSequence，first 为第一个实现的编号，返回每次运行的记录"""
+    rows = []
+    for k, seq in enumerate(seqs):
+        numbPoints, flows, rounds, infection_rate = simulate(p, np.random.default_rng(seq))
+        rows.append(dict(p=round(float(p), 4), realization=first + k, numbPoints=numbPoints, flows=flows, rounds=rounds,
+                         infection_rate=infection_rate))
+    return rows
+
+
+def mean_ci(values):
+    values = np.asarray(values, dtype=float)
+    mean = values.mean()
+    half = 1.96 * values.std(ddof=1) / np.sqrt(values.size) if values.size > 1 else 0.0
+    return f"{mean:.4f}", f"{mean - half:.4f}", f"{mean + half:.4f}"
+
+
+def summarize(rows):
+    complete = sum(row['infection_rate'] == 1.0 for row in rows)
+    summary = dict(realizations=len(rows), complete=complete, complete_rate=f"{complete / len(rows):.4f}")
+    for key in ('flows', 'rounds', 'infection_rate'):
+        summary[key + '_mean'], summary[key + '_ci95_low'], summary[key + '_ci95_high'] = mean_ci([row[key] for row in rows])
+    return summary
+
+
+def sweep(p_values=p_values, realizations=realizations, chunk=chunk, runs_path=runs_path, path=out_path):
+    # 每个 p、每次实现一个独立的随机数流
+    seqs = np.random.SeedSequence(base_seed).spawn(len(p_values))
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            open(runs_path, 'w', newline='') as runs_file, open(path, 'w', newline='') as f:
+        runs_writer = csv.DictWriter(runs_file, fieldnames=RUN_FIELDS)
+        runs_writer.writeheader()
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for p, seq in zip(p_values, seqs):
+            start = time.time()
+            children = seq.spawn(realizations)
+            firsts = list(range(0, realizations, chunk))
+            rows = []
+            for part in pool.map(run_chunk, [p] * len(firsts), [children[i:i + chunk] for i in firsts], firsts):
+                runs_writer.writerows(part)
+                runs_file.flush()
+                rows += part
+            row = dict(p=round(float(p), 4), elapsed=f"{time.time() - start:.3f}")
+            row.update(summarize(rows))
+            writer.writerow(row)
+            f.flush()
+            print(f"p: {row['p']:<5} complete: {row['complete']}/{realizations} "
+                  f"flows: {row['flows_mean']} [{row['flows_ci95_low']}, {row['flows_ci95_high']}] "
+                  f"rounds: {row['rounds_mean']} [{row['rounds_ci95_low']}, {row['rounds_ci95_high']}]")
+
+
+if __name__ == '__main__':
+    sweep()
@@ -0,0 +1,38 @@
+# 按数组保存的接收缓冲区，替代每个节点的 inbox 列表
+# 每个节点只需要知道收到了几条消息、最后一条来自谁（inbox.pop() / inbox[-1]），
+# 所以用三个预先分配的数组代替 Message 引用的列表：
+#   count[i]  本次读取前收到的消息数
+#   last[i]   最后一条消息的发送方，-1 表示没有
+#   cell[i]   最后一条消息发送方的 cell 编号（可选，构造时给出每个节点的 cell）
+# 发送方的消息可以通过 nodes[last[i]].message 取得（发送后不再修改）。
+# 一次广播对所有邻居做一次 scatter；读取后 clear 把该节点恢复为空，slot 循环中不再创建列表。
+
+import numpy as np
+
+
+class ReceiveBuffer:
+    def __init__(self, n, cells=None):
+        """cells: 每个节点的 cell 编号（整数数组），给出时同时记录发送方的 cell"""
+        self.count = np.zeros(n, dtype=np.int64)
+        self.last = np.full(n, -1, dtype=np.int64)
+        self.cells = None if cells is None else np.asarray(cells, dtype=np.int64)
+        self.cell = None if cells is None else np.full(n, -1, dtype=np.int64)
+
+    def deliver(self, sender, receivers):
+        """sender 的一次广播送达 receivers（互不相同）"""
+        self.count[receivers] += 1
+        self.last[receivers] = sender
+        if self.cell is not None:
+            self.cell[receivers] = self.cells[sender]
+
+    def clear(self, i):
+        self.count[i] = 0
+        self.last[i] = -1
+        if self.cell is not None:
+            self.cell[i] = -1
+
+    def take(self, i):
+        """读取并清空节点 i，返回 (消息数, 最后的发送方)"""
+        k, sender = int(self.count[i]), int(self.last[i])
+        self.clear(i)
+        return k, sender
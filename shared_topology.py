@@ -0,0 +1,90 @@
+# 多进程共享的拓扑
+# 固定一次部署（节点位置 + CSR 邻接，见 neighbor_index.py），研究协议本身的随机性时，拓扑在成千上万次运行中都相同。
+# 主进程构建一次，发布到共享内存（multiprocessing.shared_memory）或内存映射文件（.npy + mmap），
+# 工作进程按名字/路径连接，得到数组直接指向共享内存的 NeighborIndex，不再重建或反序列化拓扑。
+# 用法：
+#     handle, blocks = shared_topology.publish(index)      # 主进程
+#     index = shared_topology.attach(handle)               # 工作进程（handle 是普通 dict，可以作为任务参数传递）
+#     shared_topology.release(blocks)                      # 主进程用完后释放
+# 连接得到的数组为只读。
+
+import os
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+import neighbor_index
+
+# NeighborIndex 中需要共享的数组
+FIELDS = ('x', 'y', 'ptr', 'idx')
+
+
+def publish(index):
+    """把 index 的数组复制到共享内存，返回 (handle, blocks)：handle 用于 attach，blocks 由发布方保存并在用完后 release"""
+    handle = {'R': index.R, 'n': index.n, 'arrays': {}}
+    blocks = []
+    for field in FIELDS:
+        arr = getattr(index, field)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+        handle['arrays'][field] = (shm.name, arr.shape, arr.dtype.str)
+        blocks.append(shm)
+    return handle, blocks
+
+
+def release(blocks):
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+
+def open_block(name):
+    """连接已有的共享内存，不交给 resource_tracker 管理（否则工作进程退出时会把发布方的共享内存删除）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 没有 track 参数，连接时暂时跳过登记（fork 出的进程与发布方共用同一个 resource_tracker，不能 unregister）
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def view(R, n, arrays):
+    """用已有的数组组装 NeighborIndex，不重新计算邻居"""
+    index = neighbor_index.NeighborIndex.__new__(neighbor_index.NeighborIndex)
+    index.R, index.n = R, n
+    for field, arr in arrays.items():
+        setattr(index, field, arr)
+    return index
+
+
+def attach(handle):
+    """按 publish 返回的 handle 连接共享内存，返回零拷贝的只读 NeighborIndex"""
+    arrays, blocks = {}, []
+    for field, (name, shape, dtype) in handle['arrays'].items():
+        shm = open_block(name)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        arrays[field] = arr
+        blocks.append(shm)
+    index = view(handle['R'], handle['n'], arrays)
+    # 数组引用共享内存的缓冲区，需要保持 blocks 存活
+    index.blocks = blocks
+    return index
+
+
+def save(index, path):
+    """把拓扑保存到目录 path（每个数组一个 .npy），之后可以用 load 以内存映射方式打开"""
+    os.makedirs(path, exist_ok=True)
+    for field in FIELDS:
+        np.save(os.path.join(path, f'{field}.npy'), getattr(index, field))
+    np.save(os.path.join(path, 'R.npy'), np.array(index.R))
+
+
+def load(path):
+    """以内存映射方式打开 save 保存的拓扑，各进程共享操作系统的页缓存"""
+    arrays = {field: np.load(os.path.join(path, f'{field}.npy'), mmap_mode='r') for field in FIELDS}
+    R = np.load(os.path.join(path, 'R.npy')).item()
+    return view(R, len(arrays['x']), arrays)
@@ -1,11 +1,19 @@
 # Flooding 算法的简单实现
 
+import os
+import sys
 import numpy as np
 import random
 import matplotlib.pyplot as plt
-import copy
 import time
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import neighbor_index
+import event_trace
+import metrics
+from receive_buffer import ReceiveBuffer
+from state_tracker import StateTracker
+
 # Parameters 
 # input
 # D = {500, 1000, 2000, 3000, 4000}
@@ -24,29 +32,26 @@ T_PHY = 48 * 10 ** (-6)
 T_difs = 28 * 10 ** (-6)
 p = 0.55
 
+# 事件记录级别：event_trace.OFF / INFO / DEBUG，记录保存在 tracer 的环形缓冲区中（见 event_trace.py）
+TRACE_LEVEL = event_trace.OFF
+# True 时传播结束后把每个 slot 的覆盖率、转发数、接收数保存为 .npz（见 metrics.py）
+SAVE_METRICS = False
+
 T_backoff = 31 * T_slot / 2
 T_D = T_P + T_PHY + 8 * (H_MAC + Payload) / R_D
 
+tracer = event_trace.Tracer(TRACE_LEVEL)
+
 # 设置随机种子以便结果可复现
 random.seed(time.time())
 # 设置固定的随机种子
 # random.seed(42)  # 对于 Python 的 random 模块
 # np.random.seed(42)  # 对于 numpy 的随机函数
 
-class Stats:
+# N_f、消息数在发生时累加，update 不再遍历节点（见 metrics.py）
+class Stats(metrics.Metrics):
     def __init__(self):
-        self.N_f = 0
-        self.amr = 0
-        self.srb = 0
-        self.rdn = 0
-        self.T_d = 0
-    
-    def update(self):
-        self.srb = (n - self.N_f) / n
-        self.rdn = self.N_f / n
-        # amr是所有node的msg_num的平均值
-        self.amr = sum([node.msg_num for node in simu.nodes]) / n
-        self.T_d = (simu.slot - 1) * T_p + simu.slot * (T_difs + T_backoff + T_D)
+        super().__init__(n, T_p, T_difs + T_backoff + T_D)
 
 # 3. 初始化节点
 class Node:
@@ -57,36 +62,38 @@ class Node:
         self.state = state
         self.msg_num = 0
         self.message = msg
-        self.inbox = []
 
     # 节点每个时间单位的处理，定义返回值为state，表示节点的状态
     def node_process(self):
         # print(f"Node {self.id} with state {self.state}")
-        # print(f"Node {self.id} at ({self.x:.2f}, {self.y:.2f}) with state {self.state}, inbox {len(self.inbox)}")
-        self.msg_num += len(self.inbox)
-        msg = self.inbox[-1] if self.inbox else None
-        self.inbox = []
+        # 读取并清空接收缓冲区：消息数和最后一条消息的发送方（见 receive_buffer.py）
+        k, sender = simu.rx.take(self.id)
+        self.msg_num += k
+        simu.stats.receive(k)
+        msg = simu.nodes[sender].message if k else None
         if self.state == 'I':
             if msg:
                 self.state = 'B'
                 self.message = msg
-                print(f"Node {self.id} received message from {msg.id}")
+                if tracer.level:
+                    tracer.emit(simu.slot, self.id, event_trace.RECV, msg.id)
         elif self.state == 'S':
             # do nothing
             pass
         elif self.state == 'B':
             if random.random() < p or self.id == 0:
-                simu.stats.N_f += 1
+                simu.stats.forward()
                 self.broadcast()
                 self.state = 'S'
 
         return self.state
 
     def broadcast(self):
-        print(f"Node {self.id} broadcast message")
-        for i in range(n):
-            if self.id != i and simu.distance[self.id][i] < R:
-                simu.nodes[i].inbox.append(self.message)
+        if tracer.level:
+            tracer.emit(simu.slot, self.id, event_trace.SEND)
+        nbrs = simu.nbr_index.neighbors(self.id)
+        simu.rx.deliver(self.id, nbrs)
+        simu.pending.update(nbrs.tolist())
 
 class Message:
     def __init__(self, content, id):
@@ -104,13 +111,14 @@ class Simu:
         self.nodes[0].state = 'B'
         self.nodes[0].message = Message('0', 0)
         self.init_distance()
+        self.rx = ReceiveBuffer(n)
+        # 接收缓冲区可能非空的节点，I、S 节点只有收到消息时才需要处理
+        self.pending = set()
 
         # 以key:state, value: nodes的形式存储节点
         # nodes的存储方式以set的形式存储，方便节点的增删
-        self.state_nodes = {'I': set(), 'B': set(), 'S': set()}
-        self.new_nodes = {'I': set(), 'B': set(), 'S': set()}
-        for node in self.nodes:
-            self.state_nodes[node.state].add(node.id)
+        # 状态只在发生变化时更新（见 state_tracker.py）
+        self.state_nodes = StateTracker('IBS', [node.state for node in self.nodes])
 
         self.annot = ax.annotate("", xy=(0,0), xytext=(20,20), textcoords="offset points",
                                  bbox=dict(boxstyle="round", fc="w"),
@@ -125,10 +133,8 @@ class Simu:
             self.nodes.append(Node(i, random.uniform(0, D), random.uniform(0, D), 'I'))
     
     def init_distance(self):
-        self.distance = np.zeros((n, n))
-        for i in range(n):
-            for j in range(n):
-                self.distance[i][j] = np.sqrt((self.nodes[i].x - self.nodes[j].x) ** 2 + (self.nodes[i].y - self.nodes[j].y) ** 2)
+        # 只保存距离 < R 的邻居（CSR），不再构建 n*n 的 distance 矩阵
+        self.nbr_index = neighbor_index.NeighborIndex([node.x for node in self.nodes], [node.y for node in self.nodes], R)
 
     def update_annot(self, node):
         self.annot.xy = (node.x, node.y)
@@ -166,7 +172,7 @@ class Simu:
     def process_node(self, node_id):
         """处理单个节点状态转换并更新状态字典"""
         state = self.nodes[node_id].node_process()
-        self.new_nodes[state].add(node_id)
+        self.state_nodes.record(node_id, state)
 
     def print_statistics(self):
         self.stats.update()
@@ -186,25 +192,38 @@ class Simu:
             return
         
         # 每次点击模拟一个round
-        for state in ['B', 'I', 'S']:  # 这里假设只有这三种状态需要处理
-            for node_id in list(self.state_nodes[state]):  # 转换为列表以防在迭代时修改集合
-                self.process_node(node_id)
-
-        self.state_nodes = copy.deepcopy(self.new_nodes)
-        self.new_nodes = {'I': set(), 'B': set(), 'S': set()}
+        # 按 B -> I -> S、组内 id 升序处理；I、S 节点只读取并计数接收缓冲区，缓冲区为空时什么也不做，只处理收到消息的节点
+        for node_id in self.state_nodes.snapshot('B'):
+            self.process_node(node_id)
+        readers = {'I': [], 'S': []}
+        for node_id in sorted(self.pending):
+            state = self.state_nodes.states[self.state_nodes.state[node_id]]  # slot 开始时的状态
+            if self.rx.count[node_id] and state in readers:
+                readers[state].append(node_id)
+        for node_id in readers['I'] + readers['S']:
+            self.process_node(node_id)
+        # 在发送方之前处理过的 B 节点收到的消息留到下一个 slot
+        self.pending = {node_id for node_id in self.pending if self.rx.count[node_id]}
+
+        self.state_nodes.commit()
         self.slot += 1
+        self.stats.end_slot(n - self.state_nodes.count['I'])
 
         # 打印每个状态的节点数量
         for state in ['I', 'B', 'S']:
-            print(f"State {state}: {len(self.state_nodes[state])}")
+            print(f"State {state}: {self.state_nodes.count[state]}")
 
         self.visualize()
         print(f"slot {self.slot}")
-        if len(self.state_nodes['S']) == n:
+        if self.state_nodes.count['S'] == n:
             print(f"slot {self.slot} all nodes received message")
             self.ax.set_title(f"slot {self.slot} all nodes received message")
             self.print_statistics()
             self.active = False
+            if tracer.level:
+                tracer.dump(f"flooding_trace_n{n}_d{D}.npz")
+            if SAVE_METRICS:
+                self.stats.dump(f"flooding_metrics_n{n}_d{D}.npz")
 
 fig, ax = plt.subplots(figsize=(8, 8))
 ax.set_xlim(0, D)
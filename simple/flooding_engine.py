@@ -0,0 +1,217 @@
+# 概率 Flooding 的向量化引擎（frontier 传播）
+# 节点状态保存在 NumPy 数组中，每个 slot 只处理 B 节点组成的 frontier：
+#   一次抽取所有 B 节点的转发判决 -> 发送方在 CSR 邻接上展开为 (发送方, 接收方) 对 -> scatter-add 统计每个节点收到的消息数
+#   -> 收到消息的 I 节点组成下一个 slot 的 frontier
+# 每个 slot 的代价与 frontier 的边数成正比，不再为每个节点调用 node_process、为每条消息创建 Message。
+# 状态转换、随机数的消耗顺序以及 N_f、AMR、SRB、RDN、ABD 与 flooding.py 中的 Simu.run / Stats.update 一致：
+#   Simu.run 每个 slot 按 B -> I -> S、组内按 id 升序处理节点，节点处理时读取并清空 inbox（msg_num += len(inbox)）
+#   B 节点以概率 p（0 号节点必定）广播后变为 S；在本 slot 收到消息的 I 节点变为 B
+#   B 节点 j 在发送方 i 之前处理（j < i）时，i 发给 j 的消息留在 inbox 中，下一个 slot 才计入 msg_num；
+#   传播结束的 slot 中这部分消息不会再被计入 AMR
+
+import os
+import sys
+import random
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import neighbor_index
+import p_curve
+
+# Parameters（与 flooding.py 保持一致）
+# D = {500, 1000, 2000, 3000, 4000}
+# n = {16, 64, 256, 1024}
+D = 4000
+n = 1024
+R = 800
+H_MAC = 28
+Payload = 84
+R_D = 54000000
+T_p = 3 * 10 ** (-3)
+T_slot = 9 * 10 ** (-6)
+T_P = 144 * 10 ** (-6)
+T_PHY = 48 * 10 ** (-6)
+T_difs = 28 * 10 ** (-6)
+p = 0.55
+
+T_backoff = 31 * T_slot / 2
+T_D = T_P + T_PHY + 8 * (H_MAC + Payload) / R_D
+
+# 状态编码
+I, B, S = 0, 1, 2
+STATES = 'IBS'
+
+
+class VecSimu:
+    def __init__(self, D=D, n=n, R=R, p=p, seed=None, rng=None, replicas=1, topology=None):
+        """
+        seed: 设置 Python random 的种子，节点位置和转发判决按 Simu 的顺序从 random 中抽取
+        rng: 传入 np.random.Generator 时改用其批量抽取（n 很大时使用，不再与 Simu 逐 slot 对应）
+        replicas: 同时推进的独立副本数 K，节点拼接成长度为 K * n 的数组，邻接为块对角（见 neighbor_index.stack）；
+                  K > 1 时需要 rng（没有时用 seed 创建）
+        topology: 已构建的 n 个节点的 NeighborIndex（如 shared_topology.attach 得到的共享内存视图），给定时不再抽取位置
+        """
+        self.D, self.n, self.R, self.p = D, n, R, p
+        self.replicas = replicas
+        self.size = replicas * n
+        if replicas > 1 and rng is None:
+            rng = np.random.default_rng(seed)
+        self.rng = rng
+        self.slot = 0
+
+        if seed is not None:
+            random.seed(seed)
+        if topology is not None:
+            if topology.n != n or topology.R != R:
+                raise ValueError(f"topology has n={topology.n}, R={topology.R}, expected n={n}, R={R}")
+            self.x = np.tile(topology.x, replicas)
+            self.y = np.tile(topology.y, replicas)
+        else:
+            if rng is None:
+                # 与 Simu.__init__ 相同的抽取顺序：每个节点依次抽 x, y
+                xy = np.array([(random.uniform(0, D), random.uniform(0, D)) for _ in range(n)])
+                self.x, self.y = xy[:, 0].copy(), xy[:, 1].copy()
+            else:
+                self.x = rng.uniform(0, D, self.size)
+                self.y = rng.uniform(0, D, self.size)
+            # 0 号节点（广播节点）位于中心
+            self.x[::n] = D / 2
+            self.y[::n] = D / 2
+
+        if topology is None:
+            self.init_neighbors()
+        elif replicas == 1:
+            self.nbr_index = topology
+        else:
+            self.nbr_index = neighbor_index.stack([topology] * replicas)
+        self.degree = self.nbr_index.degree()
+
+        self.state = np.full(self.size, I, dtype=np.int8)
+        self.state[::n] = B
+        self.frontier = np.arange(0, self.size, n)  # 当前的 B 节点，按 id 升序
+
+        # 每个副本的统计量
+        self.N_f = np.zeros(replicas, dtype=np.int64)
+        self.delivered = np.zeros(replicas, dtype=np.int64)  # 所有广播送达的消息数
+        self.late = np.zeros(replicas, dtype=np.int64)  # 最近一个 slot 中留到下一个 slot 才计入的消息数
+        self.slots = np.zeros(replicas, dtype=np.int64)  # 每个副本运行的 slot 数
+
+    def init_neighbors(self):
+        # CSR 邻接，只包含距离 < R 的节点对
+        if self.replicas == 1:
+            self.nbr_index = neighbor_index.NeighborIndex(self.x, self.y, self.R)
+        else:
+            self.nbr_index = neighbor_index.stack([
+                neighbor_index.NeighborIndex(self.x[r * self.n:(r + 1) * self.n], self.y[r * self.n:(r + 1) * self.n], self.R)
+                for r in range(self.replicas)])
+
+    def draw(self, size):
+        if self.rng is None:
+            return np.array([random.random() for _ in range(size)])
+        return self.rng.random(size)
+
+    def done(self):
+        """没有 B 节点时传播结束（连通时所有节点都为 S）"""
+        return self.frontier.size == 0
+
+    # 处理一个 slot，对应 Simu.run 中的一次调用
+    def step(self):
+        frontier = self.frontier
+        replica = frontier // self.n
+        active = np.unique(replica)
+        self.slots[active] += 1
+
+        # B 节点按 id 升序各抽一次随机数，0 号节点必定广播
+        tx = (self.draw(frontier.size) < self.p) | (frontier % self.n == 0)
+        senders = frontier[tx]
+        self.N_f += np.bincount(replica[tx], minlength=self.replicas)
+        self.delivered += np.bincount(replica[tx], weights=self.degree[senders], minlength=self.replicas).astype(np.int64)
+
+        src, dst = self.nbr_index.edges_from(senders)
+        # 接收方是 id 更小的 B 节点：已在本 slot 处理过，消息留到下一个 slot
+        late = (self.state[dst] == B) & (dst < src)
+        self.late[active] = 0
+        self.late += np.bincount(dst[late] // self.n, minlength=self.replicas)
+
+        # scatter-add：每个节点本 slot 收到的消息数，收到消息的 I 节点成为新的 frontier
+        recv = np.zeros(self.size, dtype=np.int64)
+        np.add.at(recv, dst, 1)
+        infected = np.flatnonzero((recv > 0) & (self.state == I))
+
+        self.state[senders] = S
+        self.state[infected] = B
+        self.frontier = np.union1d(frontier[~tx], infected)
+        self.slot += 1
+
+    def run(self, max_slots=None):
+        """运行到所有副本传播结束（或达到 max_slots），返回运行的 slot 数"""
+        while not self.done() and (max_slots is None or self.slot < max_slots):
+            self.step()
+        return self.slot
+
+    def counts(self):
+        num = np.bincount(self.state, minlength=3)
+        return {st: int(num[i]) for i, st in enumerate(STATES)}
+
+    def stats(self):
+        """
+        与 Stats.update 相同的指标，每个副本一行：N_f、AMR、SRB、RDN、ABD（即 T_d），
+        以及 complete（所有节点都收到消息）和 slots
+        """
+        n = self.n
+        slots = self.slots
+        covered = np.bincount(np.flatnonzero(self.state == S) // n, minlength=self.replicas)
+        return {
+            'N_f': self.N_f,
+            'AMR': (self.delivered - self.late) / n,
+            'SRB': (n - self.N_f) / n,
+            'RDN': self.N_f / n,
+            'ABD': (slots - 1) * T_p + slots * (T_difs + T_backoff + T_D),
+            'complete': covered == n,
+            'slots': slots,
+        }
+
+    def p_curve(self, p_values, u=None):
+        """
+        同一拓扑下所有 p 的指标（monotone coupling，见 p_curve.py）：每个节点一个阈值 u，尝试次数取几何分布的逆 CDF，
+        每个 p 做一次最短路得到各节点发送的 slot，返回与 stats() 相同字段的数组，每个 p 一个元素（只支持 replicas = 1）
+        """
+        if self.replicas != 1:
+            raise ValueError("p_curve only supports replicas=1")
+        n = self.n
+        if u is None:
+            u = self.rng.random(n) if self.rng is not None else np.array([random.random() for _ in range(n)])
+        src, dst = self.nbr_index.edges_from(np.arange(n))
+        rows = {key: [] for key in ('N_f', 'AMR', 'slots', 'complete')}
+        for p in p_values:
+            send = p_curve.retry_slots(self.nbr_index, 0, u, p)
+            reached = send >= 0
+            last = send.max()
+            # 最后一个 slot 中发给 id 更小、同在该 slot 发送的 B 节点的消息不计入 AMR
+            late = np.count_nonzero((send[src] == last) & (send[dst] == last) & (dst < src))
+            rows['N_f'].append(np.count_nonzero(reached))
+            rows['AMR'].append((self.degree[reached].sum() - late) / n)
+            rows['slots'].append(last + 1)
+            rows['complete'].append(reached.all())
+        st = {key: np.array(value) for key, value in rows.items()}
+        slots = st['slots']
+        st.update(SRB=(n - st['N_f']) / n, RDN=st['N_f'] / n, ABD=(slots - 1) * T_p + slots * (T_difs + T_backoff + T_D))
+        return st
+
+
+if __name__ == '__main__':
+    import time
+
+    # 论文中的参数网格，每个点一次运行
+    for D in [500, 1000, 2000, 3000, 4000]:
+        for n in [16, 64, 256, 1024]:
+            start = time.time()
+            simu = VecSimu(D=D, n=n, rng=np.random.default_rng(42))
+            simu.run()
+            st = {key: value[0] for key, value in simu.stats().items()}
+            print(
+                f'D: {D:<4} n: {n:<5} N_f: {st["N_f"]:<4} '
+                f'AMR: {st["AMR"]:<6.2f} SRB: {st["SRB"]:<5.2f} '
+                f'RDN: {st["RDN"]:<5.2f} ABD: {st["ABD"]:<7.4f} '
+                f'complete: {st["complete"]!s:<5} elapsed: {(time.time() - start) * 1000:.1f}ms'
+            )
@@ -1,54 +1,168 @@
 import sys
-from collections import defaultdict, deque
+import heapq
+import numpy as np
 
 class Prim:
     def __init__(self):
         pass
 
     def prim(self, adj_matrix, root_id):
+        """
+        稠密 Prim：每一步一次 argmin 选点、一次带掩码的 minimum 更新距离。
+        adj_matrix[u][v] > 0 表示有边，返回 parent 列表（根和到不了的节点为 -1）
+        """
+        adj_matrix = np.asarray(adj_matrix, dtype=float)
         num_nodes = len(adj_matrix)
-        in_tree = [False] * num_nodes
-        distance = [sys.maxsize] * num_nodes
-        parent = [-1] * num_nodes
+        in_tree = np.zeros(num_nodes, dtype=bool)
+        distance = np.full(num_nodes, float(sys.maxsize))
+        parent = np.full(num_nodes, -1, dtype=np.int64)
 
         # Start with the root node
         distance[root_id] = 0
 
         for _ in range(num_nodes):
-            # Find the node with the minimum distance which is not yet included in the tree
-            u = min((d, idx) for idx, d in enumerate(distance) if not in_tree[idx])[1]
+            # Find the node with the minimum distance which is not yet included in the tree（相同时取 id 最小者）
+            u = np.argmin(np.where(in_tree, np.inf, distance))
             in_tree[u] = True
 
             # Update the distance and parent of the adjacent vertices of the picked vertex
-            for v in range(num_nodes):
-                if 0 < adj_matrix[u][v] < distance[v] and not in_tree[v]:
-                    distance[v] = adj_matrix[u][v]
-                    parent[v] = u
-
-        return parent
-
-    def build_depth_lists(self, parent, root_id, depth):
-        depth_lists = defaultdict(list)
-        queue = deque([(root_id, 0)])
-        
-        while queue:
-            node, d = queue.popleft()
-            if d > depth:
-                continue
-            depth_lists[d].append(node)
-
-            # Enqueue children
-            for child_id, p in enumerate(parent):
-                if p == node:
-                    queue.append((child_id, d + 1))
-        
-        # Fill in all levels up to 'depth' even if they are empty
-        return [depth_lists[d] for d in range(depth + 1)]
+            row = adj_matrix[u]
+            closer = (row > 0) & (row < distance) & ~in_tree
+            distance[closer] = row[closer]
+            parent[closer] = u
+
+        return parent.tolist()
+
+    def prim_sparse(self, adj_matrix, root_id):
+        """
+        稀疏 Prim（二叉堆）：adj_matrix 为 CSR 矩阵（scipy.sparse，只保存距离 < R 的边），代价 O(E log n)。
+        选点和更新规则与 prim 相同，返回相同的 parent 列表；当前树扩展完后从 id 最小的剩余节点开始新的树
+        """
+        ptr, idx, data = adj_matrix.indptr, adj_matrix.indices, adj_matrix.data
+        num_nodes = adj_matrix.shape[0]
+        in_tree = np.zeros(num_nodes, dtype=bool)
+        distance = np.full(num_nodes, float(sys.maxsize))
+        parent = np.full(num_nodes, -1, dtype=np.int64)
+
+        distance[root_id] = 0
+        heap = [(0.0, root_id)]
+        next_root = 0
+        for _ in range(num_nodes):
+            # 跳过已过期的堆元素
+            while heap and in_tree[heap[0][1]]:
+                heapq.heappop(heap)
+            if heap:
+                u = heapq.heappop(heap)[1]
+            else:
+                while in_tree[next_root]:
+                    next_root += 1
+                u = next_root
+            in_tree[u] = True
+
+            nbrs, weights = idx[ptr[u]:ptr[u + 1]], data[ptr[u]:ptr[u + 1]]
+            closer = (weights > 0) & (weights < distance[nbrs]) & ~in_tree[nbrs]
+            distance[nbrs[closer]] = weights[closer]
+            parent[nbrs[closer]] = u
+            for d, v in zip(weights[closer].tolist(), nbrs[closer].tolist()):
+                heapq.heappush(heap, (d, v))
+
+        return parent.tolist()
+
+    def children_index(self, parent):
+        """
+        子节点的 CSR 索引：children[ptr[v]:ptr[v + 1]] 为 v 的子节点（按 id 升序），
+        一次构建，可以对多个根重复使用
+        """
+        parent = np.asarray(parent, dtype=np.int64)
+        num_nodes = len(parent)
+        has_parent = np.flatnonzero(parent >= 0)
+        children = has_parent[np.argsort(parent[has_parent], kind='stable')]
+        ptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(parent[has_parent], minlength=num_nodes), out=ptr[1:])
+        return ptr, children
+
+    def build_depth_lists(self, parent, root_id, depth, children=None):
+        """
+        从 root_id 开始按层展开，返回第 0..depth 层的节点列表（层内顺序与逐个出队的 BFS 相同），代价 O(n)。
+        children 为 children_index 的结果，不传时重新构建
+        """
+        ptr, idx = self.children_index(parent) if children is None else children
+        level = np.array([root_id], dtype=np.int64)
+        depth_lists = []
+        for _ in range(depth + 1):
+            depth_lists.append(level.tolist())
+            # 每个节点的子节点依次排在一起
+            counts = ptr[level + 1] - ptr[level]
+            starts = np.repeat(ptr[level] - np.cumsum(counts) + counts, counts)
+            level = idx[starts + np.arange(counts.sum())]
+        return depth_lists
+
+    def depths(self, parent, root_id):
+        """
+        每个节点在以 root_id 为根的子树中的深度（不在其中的为 -1），用指针跳跃（pointer jumping）向量化计算，
+        每一轮每个节点跳到 2 倍远的祖先，O(n log depth)
+        """
+        parent = np.array(parent, dtype=np.int64)
+        # 以 root_id 为根的子树，root_id 不一定是整棵树的根
+        parent[root_id] = -1
+        num_nodes = len(parent)
+        jump = parent.copy()
+        dist = (parent >= 0).astype(np.int64)
+        top = np.where(parent >= 0, parent, np.arange(num_nodes))
+        active = np.flatnonzero(jump >= 0)
+        while active.size:
+            j = jump[active]
+            dist[active], top[active], jump[active] = dist[active] + dist[j], top[j], jump[j]
+            active = active[jump[active] >= 0]
+        return np.where(top == root_id, dist, -1)
 
     def prim_with_depth(self, adj_matrix, root_id, depth):
-        parent = self.prim(adj_matrix, root_id)
+        # CSR 矩阵使用稀疏 Prim
+        if hasattr(adj_matrix, 'indptr'):
+            parent = self.prim_sparse(adj_matrix, root_id)
+        else:
+            parent = self.prim(adj_matrix, root_id)
         return self.build_depth_lists(parent, root_id, depth)
 
+    def delaunay_graph(self, x, y, R=None):
+        """
+        Delaunay 三角剖分的边构成的 CSR 矩阵，权重为欧氏距离。欧氏 MST 是 Delaunay 图的子图，候选边只有 O(n) 条。
+        R 不为 None 时只保留距离 < R 的边（与 neighbor_index 相同的判断）
+        """
+        from scipy.sparse import csr_matrix
+        from scipy.spatial import Delaunay, QhullError
+
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        num_nodes = len(x)
+        if num_nodes < 3:
+            rows, cols = np.nonzero(~np.eye(num_nodes, dtype=bool))
+        else:
+            points = np.column_stack((x, y))
+            try:
+                tri = Delaunay(points)
+            except QhullError:
+                # 所有点共线等退化情况
+                tri = Delaunay(points, qhull_options='QJ')
+            ptr, cols = tri.vertex_neighbor_vertices
+            rows = np.repeat(np.arange(num_nodes), np.diff(ptr))
+        dist = np.sqrt((x[rows] - x[cols]) ** 2 + (y[rows] - y[cols]) ** 2)
+        if R is not None:
+            keep = dist < R
+            rows, cols, dist = rows[keep], cols[keep], dist[keep]
+        return csr_matrix((dist, (rows, cols)), shape=(num_nodes, num_nodes))
+
+    def euclidean_with_depth(self, x, y, root_id, depth, R=None):
+        """
+        权重为欧氏距离时的 prim_with_depth：在 Delaunay 图（可选只保留距离 < R 的边）上做稀疏 Prim，
+        结果与在完整距离矩阵上做 prim 相同，时间和内存为 O(n log n)
+        """
+        return self.prim_with_depth(self.delaunay_graph(x, y, R), root_id, depth)
+
+    def relays(self, depth_lists, root_id=0):
+        """depth lists 中除根以外的节点，返回 (relay_num, relay_list)，即 prim_simu 中 Message 的中继列表"""
+        relay_list = [j for level in depth_lists for j in level if j != root_id]
+        return len(relay_list), relay_list
+
     # Example adjacency matrix (for testing)
     # adj_matrix = [
     #     [0, 2, 0, 6, 0],
@@ -1,12 +1,22 @@
 # Prim 算法的简单实现
 
+import os
+import sys
 import numpy as np
 import random
 import matplotlib.pyplot as plt
-import copy
 import time
 import prim
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import neighbor_index
+import event_trace
+import metrics
+import link_weights
+import bitset
+from receive_buffer import ReceiveBuffer
+from state_tracker import StateTracker
+
 # Parameters 
 # input
 # D = {500, 1000, 2000, 3000, 4000}
@@ -27,16 +37,55 @@ T_difs = 28 * 10 ** (-6)
 # alpha = 0.3
 # alpha = 0 表示原始prim算法
 alpha = 0
+# True 时中继树只使用距离 < R 的边（CSR 上的稀疏 Prim），False 时与原来一样在完整的权重矩阵 w 上建树
+PRIM_IN_RANGE = False
+# True 时权重为节点间的欧氏距离，用 Delaunay 三角剖分求 MST（见 prim.Prim.euclidean_with_depth），不再使用 w
+EUCLIDEAN_TREE = False
+# PRIM_IN_RANGE 时链路权重只为距离 < R 的节点对按 (WEIGHT_SEED, i, j) 生成（见 link_weights.py），不再分配 n*n 的矩阵；
+# WEIGHT_SEED 为 None 时从 np.random 抽取
+WEIGHT_SEED = None
+SYMMETRIC_WEIGHTS = False
+
+# 事件记录级别：event_trace.OFF / INFO / DEBUG，记录保存在 tracer 的环形缓冲区中（见 event_trace.py）
+TRACE_LEVEL = event_trace.OFF
+# True 时传播结束后把每个 slot 的覆盖率、转发数、接收数保存为 .npz（见 metrics.py）
+SAVE_METRICS = False
 
 T_backoff = 31 * T_slot / 2
 T_D = T_P + T_PHY + 8 * (H_MAC + Payload) / R_D
 
+tracer = event_trace.Tracer(TRACE_LEVEL)
+
 # 设置随机种子以便结果可复现
 random.seed(time.time())
 # 设置固定的随机种子
 # random.seed(42)  # 对于 Python 的 random 模块
 # np.random.seed(42)  # 对于 numpy 的随机函数
 
+# 中继集合：所有中继节点的布尔数组（由中继树生成一次，所有消息共享，只读）加上沿途已转发、从集合中去掉的节点。
+# 成员测试 O(1)，去掉一个节点时复制 removed（长度不超过 ttl），共享的数组不变
+class RelaySet:
+    def __init__(self, members, removed=frozenset()):
+        if not isinstance(members, np.ndarray):
+            bits = np.zeros(n, dtype=bool)
+            bits[list(members)] = True
+            bits.flags.writeable = False
+            members = bits
+        self.members = members
+        self.removed = removed
+
+    def __contains__(self, node_id):
+        return self.members[node_id] and node_id not in self.removed
+
+    def __len__(self):
+        return int(self.members.sum()) - len(self.removed)
+
+    def __iter__(self):
+        return (i for i in np.flatnonzero(self.members).tolist() if i not in self.removed)
+
+    def without(self, node_id):
+        return RelaySet(self.members, self.removed | {node_id})
+
 class NetHeader:
     def __init__(self, id, relay_num, relay_list, ttl):
         self.id = id
@@ -44,20 +93,10 @@ class NetHeader:
         self.relay_list = relay_list
         self.ttl = ttl
 
-class Stats:
+# N_f、消息数在发生时累加，update 不再遍历节点（见 metrics.py）
+class Stats(metrics.Metrics):
     def __init__(self):
-        self.N_f = 0
-        self.amr = 0
-        self.srb = 0
-        self.rdn = 0
-        self.T_d = 0
-    
-    def update(self):
-        self.srb = (n - self.N_f) / n
-        self.rdn = self.N_f / n
-        # amr是所有node的msg_num的平均值
-        self.amr = sum([node.msg_num for node in simu.nodes]) / n
-        self.T_d = (simu.slot - 1) * T_p + simu.slot * (T_difs + T_backoff + T_D)
+        super().__init__(n, T_p, T_difs + T_backoff + T_D)
 
 # 3. 初始化节点
 class Node:
@@ -68,72 +107,66 @@ class Node:
         self.state = state
         self.msg_num = 0
         self.message = msg
-        self.inbox = []
         self.nbrs = set()
+        self.upstream = id  # 收到消息时的发送方，评估中继时使用
 
     # 节点每个时间单位的处理，定义返回值为state，表示节点的状态
     def node_process(self):
         # print(f"Node {self.id} with state {self.state}")
-        # print(f"Node {self.id} at ({self.x:.2f}, {self.y:.2f}) with state {self.state}, inbox {len(self.inbox)}")
-        self.msg_num += len(self.inbox)
+        # 读取并清空接收缓冲区：消息数和最后一条消息的发送方（见 receive_buffer.py）
+        k, sender = simu.rx.take(self.id)
+        self.msg_num += k
+        simu.stats.receive(k)
         if self.state == 'I':
-            msg = self.inbox[-1] if self.inbox else None
+            msg = simu.nodes[sender].message if k else None
             if msg:
-                print(f"Node {self.id} received message from {msg.id}")
-                # 遍历msg的relay_list，如果节点id在其中，则广播；否则不做任何操作
+                if tracer.level:
+                    tracer.emit(simu.slot, self.id, event_trace.RECV, msg.id)
+                # 如果节点id在msg的中继集合中，则广播；否则不做任何操作
                 if self.id in msg.relay_list:
                     self.state = 'B'
-                    # 从msg中除去自己
-                    msg.relay_list.remove(self.id)
-                    msg.id = self.id
-                    self.message = msg
+                    # 收到的 msg 被所有邻居共享，不修改，转发的是去掉自己、发送方改为自己的新消息
+                    self.upstream = msg.id
+                    self.message = msg.relayed_by(self.id)
                 else:
                     self.state = 'S'
-                print(f"Node {self.id} received message from {msg.id}")
         elif self.state == 'S':
             # do nothing
             pass
         elif self.state == 'B':
-            do_relay = self.evaluate_relay()
-            print(f"Node {self.id} do_relay: {do_relay}")
+            do_relay = simu.relay_decisions[self.id]
+            if tracer.level and not (do_relay or self.id == 0):
+                tracer.emit(simu.slot, self.id, event_trace.SKIP)
             if do_relay or self.id == 0:
-                simu.stats.N_f += 1
+                simu.stats.forward()
                 self.broadcast()
             # self.state = 'S'
-        self.inbox = []
 
         return self.state
 
     def broadcast(self):
-        print(f"Node {self.id} broadcast message")
-        for i in range(n):
-            if self.id != i and simu.distance[self.id][i] < R:
-                simu.nodes[i].inbox.append(self.message)
+        if tracer.level:
+            tracer.emit(simu.slot, self.id, event_trace.SEND)
+        nbrs = simu.nbr_index.neighbors(self.id)
+        simu.rx.deliver(self.id, nbrs)
+        simu.pending.update(nbrs.tolist())
 
     def evaluate_relay(self):
-        not_reached = self.nbrs.copy()
-        # emitters = {msg.id for msg in self.rcv_messages}
-        # 将所有的msg.emitters合并到一个集合中
-        # emitters = set()
-        # for msg in self.inbox:
-        #     emitters.update(msg.id)
-
-        # for emitter in emitters:
-        emitter = self.message.id
-        for nbr in list(not_reached):
-            if simu.distance[nbr][emitter] < R:
-                not_reached.remove(nbr)
-
-        return len(not_reached) >= alpha * len(self.nbrs)
+        # 邻居中不在 upstream 覆盖范围（距离 < R，包括 upstream 自身）内的节点数，见 Simu.evaluate_relays
+        return simu.evaluate_relays([self.id])[0]
         
 class Message:
     def __init__(self, content, id, relay_num, relay_list, ttl):
         self.id = id
         self.relay_num = relay_num
-        self.relay_list = relay_list
+        self.relay_list = relay_list if isinstance(relay_list, RelaySet) else RelaySet(relay_list)
         self.ttl = ttl
         self.content = content + "->" + str(id)
 
+    def relayed_by(self, node_id):
+        """node_id 转发的消息：发送方为 node_id，中继集合去掉 node_id，原消息不变（写时复制，共享中继集合的数组）"""
+        return Message(self.content, node_id, self.relay_num - 1, self.relay_list.without(node_id), self.ttl)
+
 class Simu:
     def __init__(self, ax, stats):
         self.ax = ax
@@ -143,39 +176,44 @@ class Simu:
         # 设定第一个节点为广播节点，位置为(0, 0)
         self.nodes[0].x, self.nodes[0].y = D / 2, D / 2
         self.nodes[0].state = 'B'
-        self.w = np.random.rand(n, n) # 生成n*n的随机矩阵作为权重
-        self.matrix = np.zeros((n, n))
         self.init_distance()
+        self.rx = ReceiveBuffer(n)
+        # 接收缓冲区可能非空的节点，I、S 节点只有收到消息时才需要处理
+        self.pending = set()
 
         prim_instance = prim.Prim()
 
-        lists = prim_instance.prim_with_depth(self.w, 0, 7)
-
-        relay_num = 0
-        relay_list = []
-        # 遍历lists
-        for i, l in enumerate(lists):
-            for j in l:
-                if j != 0:
-                    relay_num += 1
-                    relay_list.append(j)
+        if EUCLIDEAN_TREE:
+            lists = prim_instance.euclidean_with_depth(self.nbr_index.x, self.nbr_index.y, 0, 7, R if PRIM_IN_RANGE else None)
+        elif PRIM_IN_RANGE:
+            seed = int(np.random.randint(2 ** 31)) if WEIGHT_SEED is None else WEIGHT_SEED
+            self.weights = link_weights.LinkWeights(self.nbr_index, seed, SYMMETRIC_WEIGHTS)
+            lists = prim_instance.prim_with_depth(self.weights.csr(), 0, 7)
+        else:
+            self.w = np.random.rand(n, n) # 生成n*n的随机矩阵作为权重
+            lists = prim_instance.prim_with_depth(self.w, 0, 7)
+
+        # lists 中除 0 号节点以外的节点都是中继
+        relay_num, relay_list = prim_instance.relays(lists)
         
         print(f"relay_num: {relay_num}, relay_list: {relay_list}")
 
         self.nodes[0].message = Message("", 0, relay_num, relay_list, 6)
 
         # calc nbrs of node
-        for i in range(n):
-            for j in range(n):
-                if i != j and self.distance[i][j] < R:
-                    self.nodes[i].nbrs.add(j)
+        for node, nbrs in zip(self.nodes, self.nbr_index.neighbor_sets()):
+            node.nbrs = nbrs
+        # 邻居集合和覆盖集合（包括自身）的位图，见 bitset.py
+        self.nbr_bits = bitset.pack(self.nbr_index)
+        self.cover_bits = bitset.pack(self.nbr_index, include_self=True)
+        self.degree = self.nbr_index.degree()
+        # 本 slot 中 B 节点的评估结果，key: id, value: do_relay
+        self.relay_decisions = {}
 
         # 以key:state, value: nodes的形式存储节点
         # nodes的存储方式以set的形式存储，方便节点的增删
-        self.state_nodes = {'I': set(), 'B': set(), 'S': set()}
-        self.new_nodes = {'I': set(), 'B': set(), 'S': set()}
-        for node in self.nodes:
-            self.state_nodes[node.state].add(node.id)
+        # 状态只在发生变化时更新（见 state_tracker.py）
+        self.state_nodes = StateTracker('IBS', [node.state for node in self.nodes])
 
         self.annot = ax.annotate("", xy=(0,0), xytext=(20,20), textcoords="offset points",
                                  bbox=dict(boxstyle="round", fc="w"),
@@ -190,12 +228,8 @@ class Simu:
             self.nodes.append(Node(i, random.uniform(0, D), random.uniform(0, D), 'I'))
     
     def init_distance(self):
-        self.distance = np.zeros((n, n))
-        for i in range(n):
-            for j in range(n):
-                self.distance[i][j] = np.sqrt((self.nodes[i].x - self.nodes[j].x) ** 2 + (self.nodes[i].y - self.nodes[j].y) ** 2)
-                if i != j and self.distance[i][j] < R:
-                    self.matrix[i][j] = self.w[i][j]
+        # 只保存距离 < R 的邻居（CSR），不再构建 n*n 的 distance 矩阵
+        self.nbr_index = neighbor_index.NeighborIndex([node.x for node in self.nodes], [node.y for node in self.nodes], R)
 
     def update_annot(self, node):
         self.annot.xy = (node.x, node.y)
@@ -230,10 +264,16 @@ class Simu:
             self.ax.scatter(node.x, node.y, color=colors[node.state])
         plt.draw()
 
+    def evaluate_relays(self, node_ids):
+        """批量评估：未被 emitter 覆盖的邻居数 >= alpha * 邻居数 时转发"""
+        emitters = [[self.nodes[i].upstream] for i in node_ids]
+        left = bitset.uncovered(self.nbr_bits, self.cover_bits, node_ids, emitters)
+        return (left >= alpha * self.degree[node_ids]).tolist()
+
     def process_node(self, node_id):
         """处理单个节点状态转换并更新状态字典"""
         state = self.nodes[node_id].node_process()
-        self.new_nodes[state].add(node_id)
+        self.state_nodes.record(node_id, state)
 
     def print_statistics(self):
         self.stats.update()
@@ -252,26 +292,43 @@ class Simu:
         if not self.active:
             return
         
-        # 每次点击模拟一个round
-        for state in ['B', 'I', 'S']:  # 这里假设只有这三种状态需要处理
-            for node_id in list(self.state_nodes[state]):  # 转换为列表以防在迭代时修改集合
-                self.process_node(node_id)
+        # B 节点的评估只依赖 upstream，在本 slot 中不会改变，可以一次评估所有 B 节点
+        b_nodes = self.state_nodes.snapshot('B')
+        self.relay_decisions = dict(zip(b_nodes, self.evaluate_relays(b_nodes)))
 
-        self.state_nodes = copy.deepcopy(self.new_nodes)
-        self.new_nodes = {'I': set(), 'B': set(), 'S': set()}
+        # 每次点击模拟一个round
+        # 按 B -> I -> S、组内 id 升序处理；I、S 节点只读取并计数接收缓冲区，缓冲区为空时什么也不做，只处理收到消息的节点
+        for node_id in self.state_nodes.snapshot('B'):
+            self.process_node(node_id)
+        readers = {'I': [], 'S': []}
+        for node_id in sorted(self.pending):
+            state = self.state_nodes.states[self.state_nodes.state[node_id]]  # slot 开始时的状态
+            if self.rx.count[node_id] and state in readers:
+                readers[state].append(node_id)
+        for node_id in readers['I'] + readers['S']:
+            self.process_node(node_id)
+        # 在发送方之前处理过的 B 节点收到的消息留到下一个 slot
+        self.pending = {node_id for node_id in self.pending if self.rx.count[node_id]}
+
+        self.state_nodes.commit()
         self.slot += 1
+        self.stats.end_slot(n - self.state_nodes.count['I'])
 
         # 打印每个状态的节点数量
         for state in ['I', 'B', 'S']:
-            print(f"State {state}: {len(self.state_nodes[state])}")
+            print(f"State {state}: {self.state_nodes.count[state]}")
 
         self.visualize()
         print(f"slot {self.slot}")
-        if len(self.state_nodes['S']) == n:
+        if self.state_nodes.count['S'] == n:
             print(f"slot {self.slot} all nodes received message")
             self.ax.set_title(f"slot {self.slot} all nodes received message")
             self.print_statistics()
             self.active = False
+            if tracer.level:
+                tracer.dump(f"prim_trace_n{n}_d{D}.npz")
+            if SAVE_METRICS:
+                self.stats.dump(f"prim_metrics_n{n}_d{D}.npz")
 
 fig, ax = plt.subplots(figsize=(8, 8))
 ax.set_xlim(0, D)
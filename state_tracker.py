@@ -0,0 +1,57 @@
+# 节点状态的增量记录
+# 取代每个 slot 重建 new_nodes 再 copy.deepcopy 的做法：slot 内只记录发生变化的节点，
+# slot 结束时 commit，按变化更新状态编码数组、各状态的计数和节点集合，代价与状态变化次数成正比。
+# 每个状态另外保存一个按 id 升序的列表，commit 时二分插入、删除，snapshot 不再每个 slot 排序。
+
+from bisect import bisect_left, insort
+
+import numpy as np
+
+
+class StateTracker:
+    def __init__(self, states, node_states):
+        """
+        states: 所有状态，如 'IBS'
+        node_states: 每个节点的初始状态
+        """
+        self.states = list(states)
+        self.code = {st: i for i, st in enumerate(self.states)}
+        self.state = np.array([self.code[st] for st in node_states], dtype=np.int8)
+        self.nodes = {st: set() for st in self.states}
+        for node_id, st in enumerate(node_states):
+            self.nodes[st].add(node_id)
+        self.count = {st: len(self.nodes[st]) for st in self.states}
+        self.ordered = {st: sorted(self.nodes[st]) for st in self.states}
+        self.changed = []
+
+    def __getitem__(self, state):
+        # 兼容 state_nodes[state] 的用法
+        return self.nodes[state]
+
+    def snapshot(self, state):
+        """当前处于 state 的节点，按 id 升序，保证处理顺序确定（返回内部列表，commit 之前不会改变，不要修改）"""
+        return self.ordered[state]
+
+    def record(self, node_id, state):
+        """记录节点在本 slot 之后的状态，commit 时生效"""
+        if self.state[node_id] != self.code[state]:
+            self.changed.append((node_id, state))
+
+    def commit(self):
+        """应用本 slot 的状态变化，返回 [(node_id, 旧状态, 新状态)]"""
+        changes = []
+        for node_id, state in self.changed:
+            old = self.states[self.state[node_id]]
+            if old == state:
+                continue
+            self.nodes[old].discard(node_id)
+            self.nodes[state].add(node_id)
+            old_ids = self.ordered[old]
+            del old_ids[bisect_left(old_ids, node_id)]
+            insort(self.ordered[state], node_id)
+            self.count[old] -= 1
+            self.count[state] += 1
+            self.state[node_id] = self.code[state]
+            changes.append((node_id, old, state))
+        self.changed = []
+        return changes